@@ -6,9 +6,10 @@ import csv
 import os
 import sys
 import cv2 # OpenCVのインポート
-import time # target_fps制御用
 from G_config import Config # 既存のConfigクラスを利用
 from G_ScanBCD_Analyzer import G_ScanBCD_Analyzer # バーコード解析用
+from G_ScanBCD_Camera import open_camera
+from G_ScanBCD_Engine import ScanEngine # 取得・デコード・検証の共通処理
 
 class PartInfoViewer:
     def __init__(self, root, config, initial_construction_no=None, initial_barcode_value=None):
@@ -31,11 +32,10 @@ class PartInfoViewer:
 
         # カメラとスキャン関連の設定
         self.camera_index = self.config.get("camera_index", 0)
+        if isinstance(self.camera_index, (list, tuple)):
+            self.camera_index = self.camera_index[0]  # 複数台指定時は1台目を使用
         self.camera_width = self.config.get("camera_width", 640)
         self.camera_height = self.config.get("camera_height", 480)
-        self.barcode_type_to_scan = self.config.get("barcode_type", "CODE39")
-        self.expected_barcode_length = self.config.get("expected_length", 10)
-        self.target_fps = self.config.get("target_fps", 30)
 
         self.source_csv_path_var = tk.StringVar()
         self.parts_no_var = tk.StringVar()
@@ -53,6 +53,8 @@ class PartInfoViewer:
 
         # バーコード解析器のインスタンス
         self.barcode_analyzer = G_ScanBCD_Analyzer(self.config) # Configを渡す
+        self.scan_engine = None # スキャンウィンドウ表示中のみ作成
+        self.is_scanning = False
 
         # Columns to read from CSV for "same drawing search"
         self.csv_data_columns_for_same_drawing_search = (
@@ -617,14 +619,19 @@ class PartInfoViewer:
         cancel_button = ttk.Button(self.scan_window, text="キャンセル", command=self._stop_barcode_scan)
         cancel_button.pack(pady=5)
 
-        self.cap = cv2.VideoCapture(self.camera_index)
-        if not self.cap.isOpened():
+        cap = open_camera(self.config, self.camera_index) # 解像度などの設定はここで適用される
+        if not cap.isOpened():
             messagebox.showerror("カメラエラー", f"カメラ(インデックス: {self.camera_index})を開けませんでした。", parent=self.scan_window)
             self._stop_barcode_scan()
             return
 
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.camera_width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.camera_height)
+        # 最初に検証を通過したバーコードで検索する (スキャンウィンドウごとに新しいエンジンを使う)
+        self.scan_engine = ScanEngine(
+            self.config,
+            analyzer=self.barcode_analyzer,
+            on_valid_scan=lambda event: self._on_barcode_scanned(event.data),
+        )
+        self.scan_engine.add_source(cap, name=self.camera_index)
         
         self.scan_window.protocol("WM_DELETE_WINDOW", self._stop_barcode_scan)
         self.is_scanning = True
@@ -647,35 +654,28 @@ class PartInfoViewer:
         window.geometry(f'{width}x{height}+{x}+{y}')
 
     def _update_scan_feed(self):
-        if not self.is_scanning or not hasattr(self, 'cap') or not self.cap.isOpened():
+        if not self.is_scanning or self.scan_engine is None:
             return
 
-        start_time = time.time()
-        ret, frame = self.cap.read()
-
-        if ret:
-            barcodes, analyzed_frame = self.barcode_analyzer.analyze(frame.copy()) # frameをコピーして渡す
-
-            for barcode in barcodes:
-                barcode_info = barcode.data.decode('utf-8')
-                barcode_type = barcode.type
-                if barcode_type == self.barcode_type_to_scan and len(barcode_info) == self.expected_barcode_length:
-                    self._on_barcode_scanned(barcode_info)
-                    return # スキャン成功したらループ終了
+        self.scan_engine.begin_frame()
+        for source, frame in self.scan_engine.read_frames():
+            barcodes, analyzed_frame = self.scan_engine.step(frame, source)
+            if not self.is_scanning:
+                return # スキャン成功したらループ終了
 
             # Tkinterで表示するために画像を変換
-            img = cv2.cvtColor(analyzed_frame, cv2.COLOR_BGR2RGB)
+            if analyzed_frame.ndim == 2:
+                img = cv2.cvtColor(analyzed_frame, cv2.COLOR_GRAY2RGB)
+            else:
+                img = cv2.cvtColor(analyzed_frame, cv2.COLOR_BGR2RGB)
             img_tk = tk.PhotoImage(data=cv2.imencode('.ppm', img)[1].tobytes()) # PPM経由
             self.video_label.imgtk = img_tk # 参照を保持
             self.video_label.configure(image=img_tk)
 
-        # FPS制御
-        elapsed_time = time.time() - start_time
-        wait_time = (1.0 / self.target_fps) - elapsed_time
-        if wait_time > 0:
-            self.scan_window.after(int(wait_time * 1000), self._update_scan_feed)
-        else:
-            self.scan_window.after(1, self._update_scan_feed) # 最小遅延で再試行
+        # FPS制御 (次のフレームまでの待ち時間はエンジンが計算する)
+        self.scan_engine.end_frame()
+        wait_ms = int(self.scan_engine.time_until_next_frame() * 1000)
+        self.scan_window.after(max(1, wait_ms), self._update_scan_feed)
 
     def _on_barcode_scanned(self, barcode_value):
         self.barcode_entry.delete(0, tk.END)
@@ -686,8 +686,9 @@ class PartInfoViewer:
 
     def _stop_barcode_scan(self):
         self.is_scanning = False
-        if hasattr(self, 'cap') and self.cap.isOpened():
-            self.cap.release()
+        if self.scan_engine is not None:
+            self.scan_engine.close() # カメラを解放 (アナライザーは引き続き使用する)
+            self.scan_engine = None
         if hasattr(self, 'scan_window') and self.scan_window.winfo_exists():
             self.scan_window.destroy()
         self.status_var.set("準備完了")
@@ -698,6 +699,7 @@ class PartInfoViewer:
         if current_construction_no: # 空でなければ保存
             self.config.set("last_construction_no_part_viewer", current_construction_no)
         self.config.save_config() # 明示的に保存
+        self.barcode_analyzer.close() # 並列デコード用のワーカーを終了
         print("部品情報表示ツールを終了します。") # 終了ログを出力
         self.root.destroy()
 
@@ -7,7 +7,6 @@ import time
 import os
 import logging
 from logging.handlers import RotatingFileHandler
-from datetime import datetime
 import tkinter as tk # 画面サイズの取得のためにインポート
 import numpy as np
 
@@ -15,8 +14,10 @@ import numpy as np
 from G_config import Config
 from G_ScanBCD_Analyzer import G_ScanBCD_Analyzer
 from G_ProcessCsvWriter import G_ProcessCsvWriter  # G_ScanBCD_CsvWriter から変更
-from G_Shared_CountWindow import CountDisplayWindow # 別ウィンドウ表示用
 from G_ScanBCD_Overlay import OverlayDisplay
+from G_ScanBCD_FrameSource import open_frame_source, is_live_source
+from G_ScanBCD_Engine import ScanEngine, ProcessCsvSink, get_current_timestamp
+from G_ScanBCD_Control import CommandListener
 
 # ターミナル出力時文字化け対策
 sys.stdout.reconfigure(encoding="utf-8")
@@ -33,8 +34,12 @@ class ProcessScanner:
         "idle_timeout",
     }
 
-    def __init__(self, config, construction_number, process_name, supplier_name):
+    def __init__(self, config, construction_number, process_name, supplier_name, frame_source=None, headless=None):
         self.config = config
+        # 画面表示なしで動作するか (Noneの場合は config の headless に従う)
+        self.headless = self.config.get("headless", False) if headless is None else headless
+        # カメラの代わりに再生する動画ファイルまたは画像フォルダ (Noneならカメラ)
+        self.frame_source = frame_source
 
         missing_keys = []
         for key in self.REQUIRED_KEYS:
@@ -60,13 +65,6 @@ class ProcessScanner:
         self.supplier_name = supplier_name
 
         # 内部状態変数
-        self.last_scan_time = time.time()
-        self.success_count = 0
-        self.failure_count = 0
-        self.duplicate_count = 0
-        self.scan_count = 0
-        self.last_frame_time = 0
-        self.barcode_data = []  # このセッションでスキャンしたバーコードを保持
         self.count_window = None # カウント表示ウィンドウ用の変数を追加
 
         # ログ設定
@@ -81,6 +79,17 @@ class ProcessScanner:
 
         self.overlay_display = OverlayDisplay(config)
 
+        # 取得・デコード・検証・重複チェックは ScanEngine が行う
+        self.engine = ScanEngine(
+            config,
+            analyzer=self.analyzer,
+            sinks=[ProcessCsvSink(self.csv_writer)],
+            on_valid_scan=self._on_valid_scan,
+            on_idle_timeout=self._on_idle_timeout,
+        )
+        self.overlay_display.latency = self.engine.latency
+        self._display_buffer = None  # グレースケール取得時の表示用BGRバッファ (使い回す)
+
         # ディレクトリの作成
         self._create_data_dir()
 
@@ -111,13 +120,114 @@ class ProcessScanner:
         if not os.path.exists(self.log_dir):
             os.makedirs(self.log_dir)
 
+    # スキャン状態は ScanEngine が保持する (結果表示やカウント表示ウィンドウから参照される)
+    @property
+    def scan_count(self):
+        return self.engine.scan_count
+
+    @property
+    def success_count(self):
+        return self.engine.success_count
+
+    @property
+    def failure_count(self):
+        return self.engine.failure_count
+
+    @property
+    def duplicate_count(self):
+        return self.engine.duplicate_count
+
+    @property
+    def barcode_data(self):
+        return self.engine.scanned_barcodes
+
+    @property
+    def last_scan_time(self):
+        return self.engine.last_scan_time
+
+    def _on_valid_scan(self, event):
+        """新しいバーコードを受け付けたときにエンジンから呼ばれる (CSVへの書き込みはエンジンが行う)"""
+        log_message = f"工程スキャン: {event.data}, 工事番号: {self.construction_number}, 工程: {self.process_name}, 業者: {self.supplier_name}"
+        self.logger.info(log_message)
+        print(f"Scanned: {event.data} (Type: {event.type})")
+
+        self.add_scanned_info(event.data, event.type)
+
+    def _on_idle_timeout(self):
+        print(
+            f"{self.idle_timeout / 60}分間バーコードが読み込まれなかったため、スキャンを停止します。"
+        )
+
+    def _on_frame(self, source, frame, barcodes):
+        """1フレームの処理ごとにエンジンから呼ばれ、画面表示と操作の受付を行う"""
+        # オーバーレイを描画 (locationの代わりにprocess_nameを渡す。ヘッドレス時は省略)
+        if not self.headless:
+            # 描画と表示は preview_fps の周期ごとに行い、それ以外のフレームは検出結果の記録だけにする
+            if self.engine.display_clock.due(self.window_name):
+                with self.engine.latency.measure("overlay"):
+                    frame = self.display_scan_result(frame, barcodes, self.engine.remaining_time())
+                if frame is not None and isinstance(frame, np.ndarray):
+                    with self.engine.latency.measure("imshow"):
+                        cv2.imshow(self.window_name, frame)
+                else:
+                    print("Error: Invalid frame received.")
+            else:
+                self.overlay_display.update(barcodes)
+
+        if self.headless:
+            command = self._command_listener.poll()
+        else:
+            with self.engine.latency.measure("waitkey"):
+                key = cv2.waitKey(1) & 0xFF
+            command = "stop" if key == ord("q") or key == 27 else None
+
+        if command == "stop":
+            print("スキャナー停止")
+            self.engine.stop()
+        elif command == "status":
+            print(
+                f"Scans: {self.scan_count}, Success: {self.success_count}, "
+                f"Failure: {self.failure_count}, Duplicates: {self.duplicate_count}, "
+                f"Time left: {int(self.engine.remaining_time())}s"
+            )
+        elif command == "no_barcode":
+            print("工程スキャナーではバーコードなし部品の登録は使用できません。")
+
     def start(self):
-        cap = cv2.VideoCapture(self.config.get("camera_index", 0))
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.config.get("camera_width", 640))
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.config.get("camera_height", 480))
+        cap = open_frame_source(self.config, self.frame_source)
+        if is_live_source(cap):
+            # 解像度・FOURCC などは open_frame_source でカメラに適用済み
+            self.logger.info("キャプチャ設定: %s", cap.settings)
+        self.engine.add_source(cap, name="camera")
+
+        self.window_name = "Process Scanner"
+        self._command_listener = None
+        if self.headless:
+            # ヘッドレス時はキー入力の代わりに標準入力/ソケットから操作コマンドを受け付ける
+            self._command_listener = CommandListener(self.config).start()
+        else:
+            self._setup_window(self.window_name)
+
+        self.engine.run(on_frame=self._on_frame)
+
+        self.engine.close()
+        if self._command_listener is not None:
+            self._command_listener.stop()
+        else:
+            cv2.destroyAllWindows()
+        self.analyzer.close()
+        self.logger.info("オーバーレイ統計: %s", self.overlay_display.get_stats())
+        self.engine.log_stats(self.logger, extra={
+            "tool": "ProcessScanner",
+            "process_name": self.process_name,
+            "construction_number": self.construction_number,
+        })
+
+        print("工程スキャナーのメインループを終了しました。")
+        print(f"スキャン結果: {self.scan_count} 件のバーコードを検出しました。")
 
-        # ウィンドウの作成と位置設定をループの外で一度だけ行う
-        window_name = "Process Scanner"
+    def _setup_window(self, window_name):
+        """ウィンドウの作成と位置設定をループの外で一度だけ行う"""
         cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
 
         # configから画面幅と高さを取得
@@ -137,87 +247,15 @@ class ProcessScanner:
         except Exception as e:
             print(f"ウィンドウ位置の設定中にエラーが発生しました: {e}")
 
-        while True:
-            current_time = time.time()
-            elapsed_time = current_time - self.last_frame_time
-            if elapsed_time < 1 / self.target_fps:
-                time.sleep(1 / self.target_fps - elapsed_time)
-                current_time = time.time()
-
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            barcodes, frame = self.analyzer.analyze(frame)
-
-            # 残り時間を計算
-            remaining_time = max(
-                0, self.idle_timeout - (time.time() - self.last_scan_time)
-            )
-
-            # オーバーレイを描画 (locationの代わりにprocess_nameを渡す)
-            frame = self.display_scan_result(frame, barcodes, remaining_time)
-
-            if barcodes:
-                self.last_scan_time = time.time()
-
-            for barcode in barcodes:
-                # バーコードを検出した瞬間のタイムスタンプを取得
-                scanned_timestamp = self.get_current_timestamp()
-
-                barcode_info = barcode.data.decode("utf-8")
-                barcode_type = barcode.type
-                if (
-                    barcode_type == self.barcode_type
-                    and len(barcode_info) == self.expected_length
-                ):
-                    if barcode_info not in self.barcode_data:
-                        self.barcode_data.append(barcode_info)
-                        self.scan_count += 1
-                        self.success_count += 1
-
-                        # G_ProcessCsvWriter を使って書き込み
-                        self.csv_writer.write(
-                            barcode_info, barcode_type, scanned_timestamp
-                        )
-
-                        log_message = f"工程スキャン: {barcode_info}, 工事番号: {self.construction_number}, 工程: {self.process_name}, 業者: {self.supplier_name}"
-                        self.logger.info(log_message)
-                        print(f"Scanned: {barcode_info} (Type: {barcode_type})")
-
-                        self.add_scanned_info(barcode_info, barcode_type)
-                    else:
-                        self.duplicate_count += 1
-                else:
-                    self.failure_count += 1 # 不正なバーコードのため失敗カウントを増やす
-
-            if frame is not None and isinstance(frame, np.ndarray):
-                cv2.imshow(window_name, frame)
-            else:
-                print("Error: Invalid frame received.")
-
-            if self.auto_stop and remaining_time == 0:
-                print(
-                    f"{self.idle_timeout / 60}分間バーコードが読み込まれなかったため、スキャンを停止します。"
-                )
-                break
-
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord("q") or key == 27:
-                print("スキャナー停止")
-                break
-
-            self.last_frame_time = current_time
-
-        cap.release()
-        cv2.destroyAllWindows()
-
-        print("工程スキャナーのメインループを終了しました。")
-        print(f"スキャン結果: {self.scan_count} 件のバーコードを検出しました。")
-
     def display_scan_result(self, frame, barcodes, remaining_time):
         # オーバーレイに渡すコンテキストラベルを作成
         context_label = f"工程: {self.process_name} | 業者: {self.supplier_name}"
+        if frame.ndim == 2:
+            # グレースケールで取得している場合は、表示用にのみBGRへ変換する (変換先は使い回す)
+            if self._display_buffer is None or self._display_buffer.shape[:2] != frame.shape:
+                self._display_buffer = np.empty(frame.shape + (3,), dtype=np.uint8)
+                self.engine.latency.record_allocation("overlay", self._display_buffer.nbytes)
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR, dst=self._display_buffer)
 
         # OverlayDisplay を使用 (locationの代わりにprocess_nameを渡す)
         frame = self.overlay_display.display_overlay(
@@ -232,6 +270,7 @@ class ProcessScanner:
             remaining_time,
             self.config.get("barcode_type", "-"),
             self.config.get("expected_length", "-"),
+            hint=self.analyzer.quality_hint,
         )
         return frame
 
@@ -243,21 +282,30 @@ class ProcessScanner:
 
     def get_current_timestamp(self):
         """現在時刻を 'YYYY-MM-DD HH:MM:SS' 形式の文字列で返す"""
-        return datetime.now().strftime("%Y%m%d-%H%M%S")
+        return get_current_timestamp()
 
 
 def main():
     """
     コマンドライン引数から 'construction_no', 'process_name', 'supplier_name' を受け取って
-    ProcessScannerを起動する。
+    ProcessScannerを起動する。--replay を指定するとカメラの代わりに動画/画像フォルダを再生する。
     """
-    if len(sys.argv) != 4:
-        print("使用法: python G_ProcessScanner.py <工事番号> <工程名> <納品業者名>")
-        sys.exit(1)
-
-    construction_no = sys.argv[1]
-    process_name = sys.argv[2]
-    supplier_name = sys.argv[3]
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        usage="python G_ProcessScanner.py <工事番号> <工程名> <納品業者名> [--replay パス] [--realtime] [--headless]"
+    )
+    parser.add_argument("construction_no")
+    parser.add_argument("process_name")
+    parser.add_argument("supplier_name")
+    parser.add_argument("--replay", help="カメラの代わりに再生する動画ファイルまたは画像フォルダ")
+    parser.add_argument("--realtime", action="store_true", help="記録時の速度で再生する (省略時は最速で処理)")
+    parser.add_argument("--headless", action="store_true", help="画面表示なしで動作する")
+    args = parser.parse_args()
+
+    construction_no = args.construction_no
+    process_name = args.process_name
+    supplier_name = args.supplier_name
 
     try:
         config = Config("config.json")
@@ -265,6 +313,8 @@ def main():
         print(f"設定ファイル(config.json)の読み込みに失敗しました: {e}")
         # messageboxは使えないのでprintで
         sys.exit(1)
+    if args.realtime:
+        config.set("replay_realtime", True)
 
     try:
         scanner = ProcessScanner(
@@ -272,6 +322,8 @@ def main():
             construction_number=construction_no,
             process_name=process_name,
             supplier_name=supplier_name,
+            frame_source=args.replay,
+            headless=args.headless or None,
         )
         scanner.start()
     except Exception as e:
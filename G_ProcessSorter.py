@@ -286,7 +286,8 @@ def main():
             context_label="工程",
             success_count=scanner.success_count,
             duplicate_count=csv_duplicates,
-            failure_count=csv_invalid
+            failure_count=csv_invalid,
+            latency_summary=scanner.engine.latency.summary(),
         )
 
         # 4. ★★★ スキャン完了後に、CSVの重複・不正チェックを自動実行 ★★★
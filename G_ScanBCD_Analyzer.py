@@ -1,19 +1,525 @@
 # G_ScanBCD_Analyzer.py
 
+import time
+
 import cv2
-from pyzbar.pyzbar import decode
+import numpy as np
+
+from G_ScanBCD_DecodePool import DecodePool
+from G_ScanBCD_Decoders import Rect, Point, create_decoder
+from G_ScanBCD_MotionDetector import MotionDetector
+from G_ScanBCD_QualityGate import QualityGate
+
+
+def get_barcode_types(config):
+    """
+    config の barcode_type から読み取り対象のシンボル名をタプルで返す。
+    "CODE39" のような単一指定のほか、["CODE39", "CODE128"] のリストや
+    "CODE39,CODE128" のカンマ区切りも受け付ける。
+    """
+    barcode_type = config.get("barcode_type", "CODE39")
+    if isinstance(barcode_type, str):
+        barcode_type = barcode_type.split(",")
+    return tuple(str(name).strip().upper() for name in barcode_type if str(name).strip())
+
+
+def _offset_barcode(barcode, dx, dy):
+    """部分画像でのデコード結果の座標を、元画像の座標に変換する"""
+    if dx == 0 and dy == 0:
+        return barcode
+    left, top, width, height = barcode.rect
+    return barcode._replace(
+        rect=Rect(left + dx, top + dy, width, height),
+        polygon=[Point(p.x + dx, p.y + dy) for p in barcode.polygon],
+    )
+
+
+def _map_barcode(barcode, matrix):
+    """前処理（拡大・回転など）した画像でのデコード結果の座標を、2x3のアフィン行列で元画像の座標に変換する"""
+    if barcode.polygon:
+        points = [(p.x, p.y) for p in barcode.polygon]
+    else:
+        left, top, width, height = barcode.rect
+        points = [(left, top), (left + width, top), (left + width, top + height), (left, top + height)]
+    mapped = cv2.transform(np.array(points, dtype=np.float32).reshape(-1, 1, 2), matrix).reshape(-1, 2)
+    polygon = [Point(int(round(x)), int(round(y))) for x, y in mapped]
+    xs = [p.x for p in polygon]
+    ys = [p.y for p in polygon]
+    return barcode._replace(
+        rect=Rect(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)),
+        polygon=polygon,
+    )
+
+
+# 前処理カスケードで使用できる段階の名前
+PREPROCESS_STAGES = ("gray", "clahe", "adaptive_threshold", "morphology", "upscale", "rotate")
+
 
 class G_ScanBCD_Analyzer:
     def __init__(self, config):
         self.config = config
+
+        # 読み取り対象のシンボルを起動時に一度だけ決定し、デコーダーに渡す
+        self.barcode_types = get_barcode_types(self.config)
+        # デコーダーのバックエンド (pyzbar / opencv / zxing / auto)
+        self.decoder = create_decoder(self.config, self.barcode_types)
+
+        # 並列デコード設定 (decode_workers が 0 の場合は従来通りメインスレッドでデコード)
+        self.decode_workers = int(self.config.get("decode_workers", 0) or 0)
+        self.decode_tiles = int(self.config.get("decode_tiles", 1) or 1)
+        self.pipeline_depth = int(self.config.get("decode_pipeline_depth", self.decode_workers) or 0)
+        self.decode_pool = None
+        self.last_frame_id = -1  # 直近に返したデコード結果のフレームID
+        self._next_frame_id = 0
+        self._gray = None  # グレースケール変換の出力先 (フレームごとに使い回す)
+        self.latency = None  # LatencyRecorder (ScanEngine が設定する。バッファの確保を記録する)
+
+        # ROI追跡デコード設定 (直前に検出した位置の周辺だけを先にデコードする)
+        self.roi_tracking_enabled = self.config.get("roi_tracking_enabled", False)
+        self.roi_margin = self.config.get("roi_margin", 0.5)  # 検出矩形の幅・高さに対する拡張率
+        self.roi_min_margin = self.config.get("roi_min_margin", 16)  # 最低限の拡張幅 (px)
+        self.roi_full_frame_interval = max(1, int(self.config.get("roi_full_frame_interval", 10)))
+        self.roi_track_timeout = self.config.get("roi_track_timeout", 1.0)  # 検出が途切れてから追跡をやめるまでの秒数
+        self._tracks = {}  # (type, data) -> {"rect": (x0, y0, x1, y1), "timestamp": 検出時刻}
+        self._frames_since_full_decode = 0
+
+        # 前処理カスケード設定 (前の段階で読み取れなかった場合だけ次の段階を試す)
+        self.preprocess_stages = []
+        for stage in self.config.get("preprocess_stages", ["gray"]):
+            if stage in PREPROCESS_STAGES:
+                self.preprocess_stages.append(stage)
+            else:
+                print(f"警告: 未対応の前処理 '{stage}' は無視されます。")
+        if not self.preprocess_stages:
+            self.preprocess_stages = ["gray"]
+        self.preprocess_budget_ms = self.config.get("preprocess_time_budget_ms", 30)  # 1フレームあたりの時間予算
+        self.upscale_factor = self.config.get("preprocess_upscale_factor", 2.0)
+        self.rotate_angles = self.config.get("preprocess_rotate_angles", [-10, 10])
+        self._clahe = None
+        if "clahe" in self.preprocess_stages:
+            self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+
+        # 位置検出設定 (縮小画像でバーコードらしい領域を探し、その部分だけを元の解像度でデコードする)
+        self.localize_enabled = self.config.get("localize_enabled", False)
+        self.localize_scale = min(1.0, max(0.1, float(self.config.get("localize_scale", 0.5))))
+        self.localize_min_area = self.config.get("localize_min_area", 2000)  # 元画像でのピクセル数
+        self.localize_max_candidates = max(1, int(self.config.get("localize_max_candidates", 4)))
+        self.localize_padding = self.config.get("localize_padding", 0.15)  # 候補領域の幅・高さに対する余白の割合
+        self.localize_full_frame_interval = max(1, int(self.config.get("localize_full_frame_interval", 5)))
+        self.localize_percentile = self.config.get("localize_percentile", 97)  # 候補とみなす勾配の強さ (上位何%か)
+        self.localize_max_area_ratio = self.config.get("localize_max_area_ratio", 0.25)  # 画面に対する候補領域の最大割合
+        self._localize_misses = 0
+        self._localize_close_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (21, 7))
+
+        # 動き検知 (画面に変化がなければデコードを省略する)
+        self.motion_detector = MotionDetector(self.config) if self.config.get("motion_gate_enabled", False) else None
+        # 品質判定 (ピンぼけ・手ぶれ・露出不足で読めないフレームのデコードを省略する)
+        self.quality_gate = QualityGate(self.config) if self.config.get("quality_gate_enabled", False) else None
+
+        # 統計情報
+        self.stats = {
+            "frames": 0,
+            "full_frame_decodes": 0,
+            "roi_decodes": 0,
+            "roi_hits": 0,
+            "preprocess_budget_exceeded": 0,
+            "localize_runs": 0,
+            "localize_candidates": 0,
+            "localize_hits": 0,
+            "localize_full_frame_fallbacks": 0,
+        }
+        self.stage_stats = {stage: {"attempts": 0, "success": 0} for stage in self.preprocess_stages}
+
         print("\nバーコード解析開始...")
+        if self.motion_detector is not None:
+            print("INFO: 動き検知によるデコード省略が有効です。")
+        if self.quality_gate is not None:
+            print(f"INFO: 品質判定によるデコード省略が有効です (ぼやけの閾値: {self.quality_gate.focus_threshold:.1f})")
+        if self.preprocess_stages != ["gray"]:
+            print(f"INFO: 前処理カスケード: {' -> '.join(self.preprocess_stages)} (予算: {self.preprocess_budget_ms}ms)")
+        if self.localize_enabled:
+            print(
+                f"INFO: 位置検出デコードが有効です (縮小率: {self.localize_scale}, "
+                f"全体デコード間隔: {self.localize_full_frame_interval} フレーム)"
+            )
+        if self.roi_tracking_enabled:
+            print(f"INFO: ROI追跡デコードが有効です (全体デコード間隔: {self.roi_full_frame_interval} フレーム)")
+        if self.decode_workers > 0:
+            self.decode_pool = DecodePool(
+                self.decode_workers,
+                tiles=self.decode_tiles,
+                tile_overlap=self.config.get("decode_tile_overlap", 32),
+                max_in_flight=self.pipeline_depth + 1,
+                backend_name=self.decoder.name,
+                barcode_types=self.barcode_types,
+                stall_timeout=self.config.get("decode_stall_timeout", 5.0),
+            )
+            print(
+                f"INFO: 並列デコードが有効です (ワーカー: {self.decode_workers}, "
+                f"タイル: {self.decode_tiles}, 先行投入: {self.pipeline_depth})"
+            )
+
+    def analyze(self, image, force_decode=False):
+        """
+        1フレームを解析し、(barcodes, image) を返す。
+        force_decode=True の場合は、画面に変化がなくてもデコードする (確定待ちの値を読み直すときに使う)。
+        """
+        # 画像をグレースケールに変換 (カメラからグレースケールで取得済みの場合は変換しない)
+        gray = image if image.ndim == 2 else self._to_gray(image)
+        frame_id = self._next_frame_id
+        self._next_frame_id += 1
+        self.stats["frames"] += 1
+
+        # 前回のデコードから画面に変化がなければデコードを省略する
+        if self.motion_detector is not None and not self.motion_detector.should_decode(gray, force=force_decode):
+            return self._collect_pending(), image
+
+        # ぼやけ・暗さで明らかに読めないフレームはデコードを省略する
+        if self.quality_gate is not None and not self.quality_gate.should_decode(gray):
+            return self._collect_pending(), image
+
+        # 追跡中の領域を先にデコードし、見つからなければ画像全体をデコードする
+        barcodes = []
+        if self.roi_tracking_enabled and self._frames_since_full_decode < self.roi_full_frame_interval:
+            barcodes = self._decode_tracked_regions(gray)
+            if barcodes:
+                self.last_frame_id = frame_id
+                self._frames_since_full_decode += 1
+        decode_full_frame = not barcodes
+        if not barcodes and self.localize_enabled:
+            barcodes = self._decode_localized(gray)
+            if barcodes:
+                self.last_frame_id = frame_id
+                self._localize_misses = 0
+                # 位置検出は画面全体から候補を探すため、画像全体のデコードと同じく新しいバーコードも検出できる
+                # (ROI追跡の全体デコード間隔もここで数え直す。数え直さないと追跡が二度と行われなくなる)
+                self._frames_since_full_decode = 0
+                decode_full_frame = False
+            else:
+                # 候補領域で読めなかった場合も、画像全体のデコードは localize_full_frame_interval フレームに1回に抑える
+                self._localize_misses += 1
+                decode_full_frame = self._localize_misses >= self.localize_full_frame_interval
+                if decode_full_frame:
+                    self.stats["localize_full_frame_fallbacks"] += 1
+        if decode_full_frame:
+            barcodes = self._decode_full_frame(frame_id, gray)
+            self._frames_since_full_decode = 0
+            self._localize_misses = 0
+
+        if self.roi_tracking_enabled:
+            self._update_tracks(barcodes, gray.shape)
 
-    def analyze(self, image):
-        # 画像をグレースケールに変換
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # バーコードを検出
-        barcodes = decode(gray)
-        
         # 解析結果と、未変更のオリジナル画像を返す
         return barcodes, image
+
+    def _to_gray(self, image):
+        """BGR画像を、使い回しているバッファにグレースケール変換する"""
+        if self._gray is None or self._gray.shape != image.shape[:2]:
+            self._gray = np.empty(image.shape[:2], dtype=np.uint8)
+            if self.latency is not None:
+                self.latency.record_allocation("analyze", self._gray.nbytes)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+    def _decode_full_frame(self, frame_id, gray):
+        """
+        画像全体をデコードする。preprocess_stages の順に前処理を試し、
+        読み取れた段階で終了する。時間予算を超えた場合は残りの段階を省略する。
+        """
+        self.stats["full_frame_decodes"] += 1
+        if self.decode_pool is None:
+            # 並列デコード時は、結果をまとめた時点で (_decode_parallel で) 結果のフレームIDを記録する
+            self.last_frame_id = frame_id
+        start_time = time.perf_counter()
+        cache = {}  # 段階間で共有する中間画像 (二値化画像など)
+
+        for index, stage in enumerate(self.preprocess_stages):
+            if index > 0 and self._budget_exceeded(start_time):
+                self.stats["preprocess_budget_exceeded"] += 1
+                break
+            self.stage_stats[stage]["attempts"] += 1
+
+            if stage == "gray":
+                if self.decode_pool is None:
+                    barcodes = self.decoder.decode(gray)
+                else:
+                    barcodes = self._decode_parallel(frame_id, gray)
+                    if self.pipeline_depth > 0:
+                        # 先行投入時は結果が遅れて返るため、後段の前処理は行わない
+                        if barcodes:
+                            self.stage_stats[stage]["success"] += 1
+                        return barcodes
+            else:
+                barcodes = self._decode_preprocessed(stage, gray, cache, start_time)
+
+            if barcodes:
+                self.stage_stats[stage]["success"] += 1
+                return barcodes
+        return []
+
+    def _budget_exceeded(self, start_time):
+        return (time.perf_counter() - start_time) * 1000 >= self.preprocess_budget_ms
+
+    def _binarize(self, gray, cache):
+        """適応的閾値処理による二値化 (段階間で使い回す)"""
+        if "binary" not in cache:
+            cache["binary"] = cv2.adaptiveThreshold(
+                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10
+            )
+        return cache["binary"]
+
+    def _preprocessed_variants(self, stage, gray, cache):
+        """前処理した画像と、その座標を元画像に戻すアフィン行列 (Noneなら変換不要) を順に返す"""
+        if stage == "clahe":
+            yield self._clahe.apply(gray), None
+        elif stage == "adaptive_threshold":
+            yield self._binarize(gray, cache), None
+        elif stage == "morphology":
+            # 縦長のカーネルでオープニングし、かすれて途切れたバーを補完する（黒いバーを縦方向に太らせる）
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 3))
+            yield cv2.morphologyEx(self._binarize(gray, cache), cv2.MORPH_OPEN, kernel), None
+        elif stage == "upscale":
+            factor = self.upscale_factor
+            upscaled = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+            yield upscaled, np.float32([[1 / factor, 0, 0], [0, 1 / factor, 0]])
+        elif stage == "rotate":
+            height, width = gray.shape[:2]
+            center = (width / 2, height / 2)
+            for angle in self.rotate_angles:
+                matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+                rotated = cv2.warpAffine(gray, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+                yield rotated, cv2.invertAffineTransform(matrix)
+
+    def _decode_preprocessed(self, stage, gray, cache, start_time):
+        """前処理した画像をデコードし、結果の座標を元画像に戻す"""
+        for index, (image, matrix) in enumerate(self._preprocessed_variants(stage, gray, cache)):
+            if index > 0 and self._budget_exceeded(start_time):
+                self.stats["preprocess_budget_exceeded"] += 1
+                break
+            barcodes = self.decoder.decode(image)
+            if barcodes:
+                if matrix is None:
+                    return barcodes
+                return [_map_barcode(barcode, matrix) for barcode in barcodes]
+        return []
+
+    def _localize(self, gray):
+        """
+        縮小したグレースケール画像で、縦横どちらかの向きに強い勾配が並ぶ領域 (バーコードらしい領域) を探す。
+        戻り値: 元画像の座標での回転矩形 ((cx, cy), (w, h), angle) のリスト (面積の大きい順)
+        """
+        scale = self.localize_scale
+        small = gray if scale >= 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        # 一方向にそろった強い勾配 (平行なバーの縁) を強調する。勾配は float のまま扱い、8bitに丸めて飽和させない
+        # (x・y方向の勾配の差だけでは、傾いたバーで両方が打ち消し合うため、構造テンソルの異方性を使う)
+        grad_x = cv2.Scharr(small, cv2.CV_32F, 1, 0)
+        grad_y = cv2.Scharr(small, cv2.CV_32F, 0, 1)
+        jxx = cv2.blur(grad_x * grad_x, (9, 9))
+        jyy = cv2.blur(grad_y * grad_y, (9, 9))
+        jxy = cv2.blur(grad_x * grad_y, (9, 9))
+        energy = cv2.sqrt(cv2.sqrt((jxx - jyy) ** 2 + 4 * jxy ** 2))
+
+        # 画面全体の模様に引きずられないよう、判別分析 (大津) ではなく上位の割合と最大値に対する比で二値化する
+        # (百分位数は間引いた画素で求める。全画素で求めると位置検出の半分の時間がかかるため)
+        threshold = max(float(np.percentile(energy[::4, ::4], self.localize_percentile)), float(energy.max()) * 0.25)
+        if threshold <= 0:
+            return []
+        binary = cv2.compare(energy, threshold, cv2.CMP_GE)
+
+        # バーの間の隙間を埋めてから、小さなノイズを削る
+        closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, self._localize_close_kernel)
+        closed = cv2.erode(closed, None, iterations=4)
+        closed = cv2.dilate(closed, None, iterations=4)
+
+        contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = self.localize_min_area * scale * scale
+        # 画面の大部分を占める領域は背景の模様とみなし、候補にしない (画像全体のデコードと変わらないため)
+        max_area = small.shape[0] * small.shape[1] * self.localize_max_area_ratio
+        contours = sorted(
+            (c for c in contours if min_area <= cv2.contourArea(c) <= max_area), key=cv2.contourArea, reverse=True
+        )
+
+        candidates = []
+        for contour in contours[:self.localize_max_candidates]:
+            (cx, cy), (w, h), angle = cv2.minAreaRect(contour)
+            candidates.append(((cx / scale, cy / scale), (w / scale, h / scale), angle))
+        return candidates
+
+    def _deskew_candidate(self, gray, candidate):
+        """
+        回転矩形の長辺が水平になるよう、元の解像度の画像から候補領域を切り出す。
+        戻り値: (切り出した画像, 切り出し画像の座標を元画像に戻すアフィン行列)
+        """
+        (cx, cy), (w, h), angle = candidate
+        if w < h:
+            w, h = h, w
+            angle += 90
+        angle = (angle + 90) % 180 - 90  # バーコードは上下逆でも読めるため、-90～90度に収める
+        # 余白 (クワイエットゾーン) を含めて切り出す。画像全体より大きくはしない
+        pad = max(w, h) * self.localize_padding
+        height, width = gray.shape[:2]
+        out_w = max(1, int(min(w + 2 * pad, width)))
+        out_h = max(1, int(min(h + 2 * pad, height)))
+
+        if abs(angle) < 1.0:
+            # ほぼ水平な場合は回転せずに切り出す (補間で細いバーがぼやけるのを避ける)
+            x0 = min(max(0, int(round(cx - out_w / 2))), width - out_w)
+            y0 = min(max(0, int(round(cy - out_h / 2))), height - out_h)
+            return gray[y0:y0 + out_h, x0:x0 + out_w], np.float32([[1, 0, x0], [0, 1, y0]])
+
+        matrix = cv2.getRotationMatrix2D((cx, cy), angle, 1.0)
+        matrix[0, 2] += out_w / 2 - cx
+        matrix[1, 2] += out_h / 2 - cy
+        # 画像の外は白 (クワイエットゾーン) で埋める
+        crop = cv2.warpAffine(
+            gray, matrix, (out_w, out_h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=255
+        )
+        return crop, cv2.invertAffineTransform(matrix)
+
+    def _decode_localized(self, gray):
+        """位置検出で見つけた候補領域だけを元の解像度でデコードし、結果の座標を元画像に戻す"""
+        self.stats["localize_runs"] += 1
+        barcodes = []
+        seen = set()
+        for candidate in self._localize(gray):
+            self.stats["localize_candidates"] += 1
+            crop, matrix = self._deskew_candidate(gray, candidate)
+            if crop.shape[0] < 8 or crop.shape[1] < 8:
+                continue
+            for barcode in self.decoder.decode(crop):
+                key = (barcode.type, barcode.data)
+                if key in seen:
+                    continue
+                seen.add(key)
+                barcodes.append(_map_barcode(barcode, matrix))
+        if barcodes:
+            self.stats["localize_hits"] += 1
+        return barcodes
+
+    def _decode_tracked_regions(self, gray):
+        """直前に検出したバーコードの周辺領域だけをデコードする"""
+        now = time.time()
+        for key in [k for k, track in self._tracks.items() if now - track["timestamp"] > self.roi_track_timeout]:
+            del self._tracks[key]
+
+        barcodes = []
+        seen = set()
+        for track in self._tracks.values():
+            x0, y0, x1, y1 = track["rect"]
+            self.stats["roi_decodes"] += 1
+            for barcode in self.decoder.decode(gray[y0:y1, x0:x1]):
+                key = (barcode.type, barcode.data)
+                if key in seen:
+                    continue
+                seen.add(key)
+                barcodes.append(_offset_barcode(barcode, x0, y0))
+        if barcodes:
+            self.stats["roi_hits"] += 1
+        return barcodes
+
+    def _update_tracks(self, barcodes, shape):
+        """検出したバーコードの位置から、次のフレームでデコードする領域を更新する"""
+        height, width = shape[:2]
+        now = time.time()
+        for barcode in barcodes:
+            xs = [p.x for p in barcode.polygon] or [barcode.rect.left, barcode.rect.left + barcode.rect.width]
+            ys = [p.y for p in barcode.polygon] or [barcode.rect.top, barcode.rect.top + barcode.rect.height]
+            margin_x = max(self.roi_min_margin, int((max(xs) - min(xs)) * self.roi_margin))
+            margin_y = max(self.roi_min_margin, int((max(ys) - min(ys)) * self.roi_margin))
+            rect = (
+                max(0, min(xs) - margin_x),
+                max(0, min(ys) - margin_y),
+                min(width, max(xs) + margin_x),
+                min(height, max(ys) + margin_y),
+            )
+            self._tracks[(barcode.type, barcode.data)] = {"rect": rect, "timestamp": now}
+
+    def _collect_pending(self):
+        """デコードを省略したフレームでも、先行投入済みのフレームの結果は回収する"""
+        if self.decode_pool is None or self.pipeline_depth <= 0:
+            return []
+        barcodes = []
+        for completed_id, tile_results in self.decode_pool.results():
+            barcodes.extend(self._merge_tile_results(completed_id, tile_results))
+            self.last_frame_id = completed_id
+        return barcodes
+
+    def flush(self):
+        """
+        先行投入済みでまだ返していないフレームの結果を全て待って返す。
+        decode_pipeline_depth > 0 の場合、最後の数フレームの結果はこれを呼ぶまで返らないため、
+        ストリームの終わりと close() の前に呼ぶ。
+        """
+        if self.decode_pool is None:
+            return []
+        barcodes = []
+        for completed_id, tile_results in self.decode_pool.results(block=True):
+            barcodes.extend(self._merge_tile_results(completed_id, tile_results))
+            self.last_frame_id = completed_id
+        return barcodes
+
+    def get_stats(self):
+        """解析処理の統計情報を返す"""
+        stats = dict(self.stats)
+        for stage, counts in self.stage_stats.items():
+            stats[f"stage_{stage}_attempts"] = counts["attempts"]
+            stats[f"stage_{stage}_success"] = counts["success"]
+        if self.motion_detector is not None:
+            stats.update(self.motion_detector.get_stats())
+        if self.quality_gate is not None:
+            stats.update(self.quality_gate.get_stats())
+        if self.decode_pool is not None:
+            stats["decode_stalled_frames"] = self.decode_pool.stalled_count
+        return stats
+
+    @property
+    def motion_detected(self):
+        """直近のフレームで動きを検知した場合にTrue (動き検知が無効の場合は None)"""
+        return self.motion_detector.last_motion if self.motion_detector is not None else None
+
+    @property
+    def quality_hint(self):
+        """品質判定でデコードを省略した場合に、オーバーレイに表示するヒント (なければ None)"""
+        return self.quality_gate.hint if self.quality_gate is not None else None
+
+    def is_target_type(self, barcode_type):
+        """読み取り対象のバーコードタイプであればTrueを返す"""
+        return barcode_type in self.barcode_types
+
+    def _decode_parallel(self, frame_id, gray):
+        """
+        ワーカープロセスでデコードする。
+        decode_pipeline_depth > 0 の場合は結果を待たずに次のフレームへ進み、
+        完了済みのフレームの結果をフレーム順に返す（数フレーム遅れて返る）。
+        """
+        if self.pipeline_depth > 0:
+            self.decode_pool.submit(frame_id, gray)
+            completed = self.decode_pool.results()
+        else:
+            completed = self.decode_pool.decode(frame_id, gray)
+
+        barcodes = []
+        for completed_id, tile_results in completed:
+            barcodes.extend(self._merge_tile_results(completed_id, tile_results))
+            self.last_frame_id = completed_id
+        return barcodes
+
+    def _merge_tile_results(self, frame_id, tile_results):
+        """タイルごとのデコード結果を元画像の座標に戻して1つにまとめる"""
+        barcodes = []
+        seen = set()
+        for (y0, _, x0, _), tile_barcodes in tile_results:
+            for barcode in tile_barcodes or []:
+                # 重なり合うタイルで同じバーコードが二重に検出されるのを除く
+                key = (barcode.type, barcode.data)
+                if key in seen:
+                    continue
+                seen.add(key)
+                barcodes.append(_offset_barcode(barcode, x0, y0))
+        return barcodes
+
+    def close(self):
+        """並列デコード用のワーカープロセスを終了する"""
+        if self.decode_pool is not None:
+            self.decode_pool.close()
+            self.decode_pool = None
@@ -0,0 +1,207 @@
+# G_ScanBCD_BatchDecode.py
+# 納品業者から送られてきた部品ラベルの写真をまとめてデコードし、通常のスキャンと同じCSVに登録するツール
+#
+# 実行例:
+#   python G_ScanBCD_BatchDecode.py 写真フォルダ --construction-number 4656 --location K1
+#   python G_ScanBCD_BatchDecode.py 写真フォルダ --construction-number 4656 --location K1 --report log/batch.csv
+
+import argparse
+import csv
+import glob
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import cv2
+
+from G_config import Config
+from G_ScanBCD_Analyzer import G_ScanBCD_Analyzer, _offset_barcode, get_barcode_types
+from G_ScanBCD_CsvWriter import G_ScanBCD_CsvWriter
+from G_ScanBCD_Decoders import create_decoder
+from G_ScanBCD_Engine import ScanEngine, CsvSink
+from G_ScanBCD_FrameSource import IMAGE_EXTENSIONS
+
+# ターミナル出力時文字化け対策
+sys.stdout.reconfigure(encoding="utf-8")
+
+_worker_analyzer = None  # ワーカープロセスごとのアナライザー
+_worker_tile_size = 0
+_worker_tile_overlap = 0
+
+
+def batch_config(config):
+    """静止画を1枚ずつ独立してデコードするための設定を作成する"""
+    config = dict(config)
+    config.update({
+        # フレーム間の状態を使う機能と、プロセス内の並列デコードは使用しない (画像単位でプロセス並列化する)
+        "roi_tracking_enabled": False,
+        "motion_gate_enabled": False,
+        "decode_workers": 0,
+        # 位置検出で読めなかった画像も必ず画像全体をデコードするよう、位置検出は使用しない
+        # (全体デコードへのフォールバックは localize_full_frame_interval 回に1回しか行われないため)
+        "localize_enabled": False,
+        # 品質判定はカメラ映像向けのため、画像を丸ごと省略しないよう使用しない
+        "quality_gate_enabled": False,
+        # 静止画は1回しか読まないため、複数回の読み取りによる確定は行わない
+        "confirm_reads": 1,
+    })
+    return config
+
+
+def tile_rects(width, height, tile_size, overlap):
+    """
+    画像を tile_size 四方のタイルに分割した (x0, y0, x1, y1) のリストを返す。
+    タイルの境界にかかったバーコードも読めるよう、隣のタイルと overlap px 重ねる。
+    """
+    if tile_size <= 0 or (width <= tile_size and height <= tile_size):
+        return [(0, 0, width, height)]
+    step = max(1, tile_size - overlap)
+    rects = []
+    for y0 in range(0, max(1, height - overlap), step):
+        for x0 in range(0, max(1, width - overlap), step):
+            rects.append((x0, y0, min(width, x0 + tile_size), min(height, y0 + tile_size)))
+    return rects
+
+
+def _init_worker(config, tile_size, tile_overlap):
+    global _worker_analyzer, _worker_tile_size, _worker_tile_overlap
+    _worker_analyzer = G_ScanBCD_Analyzer(config)
+    _worker_tile_size = tile_size
+    _worker_tile_overlap = tile_overlap
+
+
+def decode_image(path):
+    """
+    1枚の画像から全てのバーコードをデコードする (ワーカープロセスで実行)。
+    戻り値: (path, barcodes, error, elapsed_seconds)
+    """
+    start = time.perf_counter()
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return path, [], "画像を読み込めませんでした", time.perf_counter() - start
+
+    height, width = gray.shape
+    found = {}
+    for x0, y0, x1, y1 in tile_rects(width, height, _worker_tile_size, _worker_tile_overlap):
+        barcodes, _ = _worker_analyzer.analyze(gray[y0:y1, x0:x1])
+        barcodes += _worker_analyzer.flush()  # 先行投入されたタイルの結果も、座標を戻す前に回収する
+        for barcode in barcodes:
+            # 重なり部分で同じバーコードが複数のタイルから読めた場合は1件にまとめる
+            found.setdefault((barcode.data, barcode.type), _offset_barcode(barcode, x0, y0))
+    return path, list(found.values()), None, time.perf_counter() - start
+
+
+def list_images(directory):
+    """フォルダ内の画像ファイルをファイル名順に返す"""
+    return sorted(
+        path for path in glob.glob(os.path.join(directory, "*"))
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def run_batch(config, directory, location, construction_number, workers=None):
+    """
+    フォルダ内の全画像をデコードし、検証と重複チェックを通ったバーコードをCSVに書き込む。
+    ファイルごとの結果 (辞書) のリストを返す。
+    """
+    paths = list_images(directory)
+    if not paths:
+        print(f"画像が見つかりません: {directory}")
+        return []
+
+    decode_config = batch_config(config.config if isinstance(config, Config) else config)
+    # decoder_backend が auto の場合のキャリブレーションは親プロセスで1回だけ行い、ワーカーには選んだ名前を渡す
+    decode_config["decoder_backend"] = create_decoder(decode_config, get_barcode_types(decode_config)).name
+    tile_size = int(config.get("batch_tile_size", 1600) or 0)
+    tile_overlap = int(config.get("batch_tile_overlap", 256))
+    if workers is None:
+        workers = int(config.get("batch_workers", 0) or 0) or os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths)))
+
+    # 検証・重複チェック・CSVへの書き込みは通常のスキャンと同じエンジンで行う
+    # (デコードはワーカーで行うため、エンジンのアナライザーは作成されない)
+    report = {}
+    current = {}
+
+    def tally(key):
+        return lambda event: current[key].append(event.data)
+
+    engine = ScanEngine(
+        decode_config,
+        sinks=[CsvSink(G_ScanBCD_CsvWriter(config), location, construction_number,
+                       config.get("current_worker", "unknown"))],
+        on_valid_scan=tally("accepted"),
+        on_duplicate=tally("duplicates"),
+        on_invalid=tally("invalid"),
+    )
+
+    print(f"{len(paths)} 枚の画像を {workers} プロセスでデコードします...")
+    start = time.perf_counter()
+    pool = None
+    try:
+        if workers == 1:
+            _init_worker(decode_config, tile_size, tile_overlap)
+            results = map(decode_image, paths)
+        else:
+            ctx = mp.get_context("spawn")  # スレッドを持つ親プロセスからでも安全に起動できるようspawnを使用
+            pool = ctx.Pool(workers, initializer=_init_worker, initargs=(decode_config, tile_size, tile_overlap))
+            results = pool.imap(decode_image, paths)  # 結果はファイル名順に返る
+
+        for path, barcodes, error, elapsed in results:
+            current = {"accepted": [], "duplicates": [], "invalid": []}
+            engine.handle_barcodes(barcodes, source=None)
+            report[path] = dict(current, file=os.path.basename(path), error=error, elapsed_ms=round(elapsed * 1000, 1))
+            status = error or (
+                f"登録 {len(current['accepted'])} 件, 重複 {len(current['duplicates'])} 件, "
+                f"不正 {len(current['invalid'])} 件"
+            )
+            print(f"  {os.path.basename(path)}: {status} ({elapsed * 1000:.0f} ms)")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        engine.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"完了: {len(paths)} 枚 / {elapsed:.1f} 秒, 登録 {engine.success_count} 件, "
+        f"重複 {engine.duplicate_count} 件, 不正 {engine.failure_count} 件"
+    )
+    return [report[path] for path in paths if path in report]
+
+
+def write_report(rows, path):
+    """ファイルごとの結果をCSVに書き出す"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["file", "accepted", "duplicates", "invalid", "elapsed_ms", "error", "barcodes"])
+        for row in rows:
+            writer.writerow([
+                row["file"], len(row["accepted"]), len(row["duplicates"]), len(row["invalid"]),
+                row["elapsed_ms"], row["error"] or "", " ".join(row["accepted"]),
+            ])
+    print(f"ファイルごとの結果を {path} に書き出しました。")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="部品ラベルの写真をまとめてデコードし、スキャン結果のCSVに登録する")
+    parser.add_argument("directory", help="画像ファイルのあるフォルダ")
+    parser.add_argument("--construction-number", required=True, help="工事番号")
+    parser.add_argument("--location", required=True, help="保管場所")
+    parser.add_argument("--workers", type=int, help="並列に処理するプロセス数 (省略時は batch_workers / CPU数)")
+    parser.add_argument("--report", help="ファイルごとの結果を書き出すCSVファイル")
+    args = parser.parse_args()
+
+    config = Config("config.json")
+    os.makedirs(config.get("data_dir", "data"), exist_ok=True)
+    rows = run_batch(config, args.directory, args.location, args.construction_number, args.workers)
+    if args.report and rows:
+        write_report(rows, args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# G_ScanBCD_Camera.py
+# カメラのキャプチャ設定 (FOURCC・解像度・FPS・バッファ数) を行い、
+# 必要に応じてグレースケール (Y成分) のフレームを直接取り出すためのモジュール
+
+import cv2
+import numpy as np
+
+
+def fourcc_to_str(value):
+    """CAP_PROP_FOURCC の数値を "MJPG" などの文字列に変換する"""
+    value = int(value)
+    if value <= 0:
+        return ""
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00")
+
+
+def configure_capture(cap, config):
+    """
+    config の設定をカメラに要求し、ドライバが実際に適用した値を読み戻して返す。
+    要求と異なる値になった場合は警告を表示する。
+    戻り値: {"fourcc", "width", "height", "fps", "buffer_size"}
+    """
+    # FOURCC は解像度より先に設定する (ドライバによっては解像度の選択肢がフォーマットで変わるため)
+    fourcc_preferences = config.get("camera_fourcc", "")
+    if isinstance(fourcc_preferences, str):
+        fourcc_preferences = [fourcc_preferences] if fourcc_preferences else []
+    for fourcc in fourcc_preferences:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc.upper().ljust(4)[:4]))
+        if fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)) == fourcc.upper():
+            break
+
+    requested = {
+        "width": config.get("camera_width", 640),
+        "height": config.get("camera_height", 480),
+        "fps": config.get("camera_fps", 0),  # 0 の場合はドライバの既定値のまま
+        "buffer_size": config.get("camera_buffer_size", 1),  # ドライバ側に溜めるフレーム数 (0 で既定値)
+    }
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, requested["width"])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, requested["height"])
+    if requested["fps"]:
+        cap.set(cv2.CAP_PROP_FPS, requested["fps"])
+    if requested["buffer_size"]:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, requested["buffer_size"])
+
+    granted = {
+        "fourcc": fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": round(cap.get(cv2.CAP_PROP_FPS), 2),
+        "buffer_size": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+
+    if fourcc_preferences and granted["fourcc"] not in [f.upper() for f in fourcc_preferences]:
+        print(f"警告: カメラは FOURCC {'/'.join(fourcc_preferences)} に対応していません (現在: {granted['fourcc'] or '不明'})。")
+    for key in ("width", "height", "fps", "buffer_size"):
+        # 値 0 は「ドライバが値を返さない」ことを示すため比較しない
+        if requested[key] and granted[key] and abs(granted[key] - requested[key]) > 0.5:
+            print(f"警告: カメラ設定 {key} は {requested[key]} を要求しましたが {granted[key]} が適用されました。")
+    return granted
+
+
+def _copy_into(dst, src):
+    """src を dst にコピーして返す。dst の形状が合わない場合は新しい配列にコピーする"""
+    if dst is not None and dst.shape == src.shape and dst.dtype == src.dtype:
+        np.copyto(dst, src)
+        return dst
+    return np.array(src, copy=True, order="C")
+
+
+class CameraCapture:
+    """
+    cv2.VideoCapture をラップし、起動時にキャプチャ設定を適用する。
+    camera_grayscale が有効な場合は、BGRへの変換を行わずに輝度 (Y) 成分だけを返す。
+    FrameGrabber のキャプチャスレッドから read() が呼ばれるため、変換処理はデコードと並行して行われる。
+    """
+
+    is_live = True
+
+    def __init__(self, camera_index, config):
+        self.camera_index = camera_index
+        self._cap = cv2.VideoCapture(camera_index)
+        self.grayscale = bool(config.get("camera_grayscale", False))
+        self.raw_mode = False  # ドライバからの生データ (MJPG/YUYV) を自前で変換するか
+        self._raw = None  # グレースケール取得時に、ドライバからの生データを受け取る配列 (毎回使い回す)
+        self.settings = {}
+        if not self._cap.isOpened():
+            return
+
+        self.settings = configure_capture(self._cap, config)
+        if self.grayscale:
+            # V4L2 などでは CONVERT_RGB を無効にすると、ドライバの生データがそのまま返る
+            self._cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            self.raw_mode = self._cap.get(cv2.CAP_PROP_CONVERT_RGB) == 0
+        self.settings["grayscale"] = self.grayscale
+        self.settings["raw_mode"] = self.raw_mode
+        print(
+            f"カメラ {camera_index}: {self.settings['fourcc'] or '既定'} "
+            f"{self.settings['width']}x{self.settings['height']} @ {self.settings['fps']} FPS, "
+            f"バッファ {self.settings['buffer_size']}"
+            + (" (グレースケール取得)" if self.grayscale else "")
+        )
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def read(self, image=None):
+        """
+        cv2.VideoCapture.read() と同じ (ret, frame) を返す。image を渡した場合は、
+        形状が合えばその配列に書き込んで返す (フレームごとの配列の確保を省く)。
+        """
+        if not self.grayscale:
+            return self._cap.read(image) if image is not None else self._cap.read()
+        ret, raw = self._cap.read(self._raw) if self._raw is not None else self._cap.read()
+        if not ret or raw is None:
+            return ret, raw
+        self._raw = raw
+        return True, self._to_gray(raw, image)
+
+    def _to_gray(self, frame, dst=None):
+        """
+        取得したフレームを輝度 (Y) 成分の2次元配列に変換する。
+        生データの配列は次の読み込みで上書きされるため、結果は必ず別の配列 (形状が合えば dst) に書き込む。
+        """
+        if frame.ndim == 3 and frame.shape[2] == 3:
+            # ドライバが変換済みの BGR を返した (CONVERT_RGB を無効にできなかった)
+            if dst is not None and dst.shape == frame.shape[:2]:
+                return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=dst)
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if frame.ndim == 3 and frame.shape[2] == 2:
+            # YUYV: 各画素の1バイト目が Y 成分
+            return _copy_into(dst, frame[:, :, 0])
+
+        width, height = self.settings["width"], self.settings["height"]
+        if frame.ndim == 2 and frame.shape == (height, width):
+            return _copy_into(dst, frame)  # 既にグレースケール (GREY / Y800)
+        if frame.size == width * height * 2 and self.settings["fourcc"] != "MJPG":
+            return _copy_into(dst, frame.reshape(height, width, 2)[:, :, 0])
+        # MJPG: JPEG をグレースケールで直接展開する (色差成分の展開を省略できる)
+        gray = cv2.imdecode(frame.reshape(-1), cv2.IMREAD_GRAYSCALE)
+        return gray if gray is not None else frame.copy()
+
+    def set(self, prop_id, value):
+        return self._cap.set(prop_id, value)
+
+    def get(self, prop_id):
+        return self._cap.get(prop_id)
+
+    def release(self):
+        self._cap.release()
+
+
+def open_camera(config, camera_index):
+    """キャプチャ設定を適用したカメラを開く"""
+    return CameraCapture(camera_index, config)
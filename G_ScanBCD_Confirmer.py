@@ -0,0 +1,83 @@
+# G_ScanBCD_Confirmer.py
+# 同じ値が一定時間内に複数回読み取れた場合にのみ、読み取り結果を確定させるためのクラス
+# (傷のあるラベルの誤読が1フレームだけ出ても、CSVに登録されないようにする)
+
+import time
+from collections import OrderedDict, deque
+
+from G_ScanBCD_Instrumentation import _percentile
+
+
+class ReadConfirmer:
+    """
+    値ごとに「最初に読めた時刻」と「読めた回数」を保持し、confirm_window_ms 以内に
+    confirm_reads 回読めた値を確定とする。期限切れの値は古い順に先頭から削除する。
+    """
+
+    def __init__(self, confirm_reads=2, confirm_window_ms=500, stats_window=1000):
+        self.confirm_reads = max(1, int(confirm_reads))
+        self.window = max(0.0, confirm_window_ms / 1000)
+        # 値 -> [最初に読めた時刻, 読めた回数]。挿入順 = 最初に読めた時刻の順
+        self._pending = OrderedDict()
+
+        # 統計情報
+        self.confirmed_count = 0
+        self.expired_count = 0  # 期限内に confirm_reads 回に達しなかった値 (誤読の可能性)
+        self._time_to_confirm = deque(maxlen=stats_window)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            confirm_reads=config.get("confirm_reads", 1),
+            confirm_window_ms=config.get("confirm_window_ms", 500),
+        )
+
+    def _expire(self, now):
+        """期限切れの値を先頭 (最も古い値) から削除する"""
+        while self._pending:
+            value, (first_time, _) = next(iter(self._pending.items()))
+            if now - first_time <= self.window:
+                break
+            del self._pending[value]
+            self.expired_count += 1
+
+    def has_pending(self, now=None):
+        """確定待ちの値 (期限内にもう一度読む必要がある値) があればTrue"""
+        if not self._pending:
+            return False
+        self._expire(time.perf_counter() if now is None else now)
+        return bool(self._pending)
+
+    def observe(self, value, now=None):
+        """値を1回読み取ったことを記録し、確定した場合はTrueを返す"""
+        if self.confirm_reads <= 1:
+            self.confirmed_count += 1
+            self._time_to_confirm.append(0.0)
+            return True
+
+        now = time.perf_counter() if now is None else now
+        self._expire(now)
+        entry = self._pending.get(value)
+        if entry is None:
+            self._pending[value] = [now, 1]
+            return False
+
+        entry[1] += 1
+        if entry[1] < self.confirm_reads:
+            return False
+        del self._pending[value]
+        self.confirmed_count += 1
+        self._time_to_confirm.append(now - entry[0])
+        return True
+
+    def get_stats(self):
+        """確定数・期限切れ数と、確定までの時間 (ミリ秒) の統計を返す"""
+        values = sorted(self._time_to_confirm)
+        return {
+            "confirm_confirmed": self.confirmed_count,
+            "confirm_expired": self.expired_count,
+            "confirm_pending": len(self._pending),
+            "confirm_time_p50_ms": round(_percentile(values, 50) * 1000, 1),
+            "confirm_time_p95_ms": round(_percentile(values, 95) * 1000, 1),
+            "confirm_time_max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+        }
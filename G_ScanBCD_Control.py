@@ -0,0 +1,102 @@
+# G_ScanBCD_Control.py
+# 画面なし（ヘッドレス）で動作するスキャナに、標準入力またはローカルのソケットから操作コマンドを送るためのクラス
+
+import queue
+import socket
+import sys
+import threading
+
+# 受け付けるコマンド名と、その別名
+COMMAND_ALIASES = {
+    "stop": "stop",
+    "q": "stop",
+    "quit": "stop",
+    "exit": "stop",
+    "no_barcode": "no_barcode",
+    "n": "no_barcode",
+    "status": "status",
+    "s": "status",
+}
+
+
+def parse_command(line):
+    """入力された1行をコマンド名に変換する。不明な場合はNone"""
+    return COMMAND_ALIASES.get(line.strip().lower())
+
+
+class CommandListener:
+    """
+    標準入力と、127.0.0.1 上のTCPポート (control_port) から1行1コマンドで操作を受け付ける。
+    受け付けたコマンドはキューに積まれ、スキャナのメインループから poll() で取り出す。
+    """
+
+    def __init__(self, config, use_stdin=True):
+        self.config = config
+        self.port = int(self.config.get("control_port", 0) or 0)  # 0 の場合はソケットを使用しない
+        self.use_stdin = use_stdin
+        self._commands = queue.Queue()
+        self._server = None
+        self._running = False
+
+    def start(self):
+        self._running = True
+        if self.use_stdin:
+            threading.Thread(target=self._stdin_loop, name="CommandListener-stdin", daemon=True).start()
+        if self.port:
+            try:
+                self._server = socket.create_server(("127.0.0.1", self.port))
+                self._server.settimeout(0.5)
+                threading.Thread(target=self._socket_loop, name="CommandListener-socket", daemon=True).start()
+                print(f"操作コマンドを 127.0.0.1:{self.port} で受け付けます。")
+            except OSError as e:
+                print(f"警告: 操作用ポート {self.port} を開けませんでした: {e}")
+                self._server = None
+        print("操作コマンド: stop (q) = 停止, no_barcode (n) = バーコードなし部品の登録, status (s) = カウント表示")
+        return self
+
+    def _stdin_loop(self):
+        for line in sys.stdin:
+            if not self._running:
+                break
+            self._put(line)
+
+    def _socket_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+    def _handle_connection(self, conn):
+        with conn, conn.makefile("r", encoding="utf-8") as reader:
+            for line in reader:
+                accepted = self._put(line)
+                try:
+                    conn.sendall(b"OK\n" if accepted else b"UNKNOWN\n")
+                except OSError:
+                    break
+
+    def _put(self, line):
+        command = parse_command(line)
+        if command is None:
+            if line.strip():
+                print(f"不明なコマンドです: {line.strip()}")
+            return False
+        self._commands.put(command)
+        return True
+
+    def poll(self):
+        """受け付けたコマンドを1件取り出す。なければNone"""
+        try:
+            return self._commands.get_nowait()
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self._running = False
+        if self._server is not None:
+            self._server.close()
+            self._server = None
@@ -0,0 +1,218 @@
+# G_ScanBCD_DecodePool.py
+# バーコードのデコードを複数のワーカープロセスで並列実行するためのクラス
+
+import multiprocessing as mp
+import queue
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _attach_shared_memory(name):
+    """
+    ワーカー側で共有メモリに接続する。
+    spawnで起動したワーカーは親プロセスのリソーストラッカーを共有するため、ここで登録を解除すると
+    親プロセスの登録まで消えてしまう (親の unlink() 時にトラッカーが KeyError を出力する)。
+    共有メモリの破棄は親プロセスが unlink() で行い、その時点で登録も解除される。
+    """
+    return shared_memory.SharedMemory(name=name)
+
+
+def _decode_worker(task_queue, result_queue, backend_name, barcode_types):
+    """
+    ワーカープロセスのメインループ。親プロセスと同じバックエンドでデコードする。
+    タスク: (frame_id, tile_index, 共有メモリ名, 画像サイズ, (y0, y1, x0, x1))
+    結果:   (frame_id, tile_index, バーコードのリスト)
+    """
+    from G_ScanBCD_Decoders import create_backend
+
+    decoder = create_backend(backend_name, barcode_types)
+    attached = {}
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        frame_id, tile_index, shm_name, shape, (y0, y1, x0, x1) = task
+        try:
+            shm = attached.get(shm_name)
+            if shm is None:
+                shm = _attach_shared_memory(shm_name)
+                attached[shm_name] = shm
+            gray = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+            barcodes = decoder.decode(gray[y0:y1, x0:x1])
+        except Exception as e:
+            print(f"デコードワーカーでエラーが発生しました (frame {frame_id}): {e}")
+            barcodes = []
+        result_queue.put((frame_id, tile_index, barcodes))
+
+    for shm in attached.values():
+        shm.close()
+
+
+class DecodePool:
+    """
+    グレースケール画像を共有メモリ経由でワーカープロセスに渡し、並列にデコードする。
+    画像は横長の短冊（タイル）に分割でき、各タイルが別々のワーカーで処理される。
+    結果は投入したフレームの順番通りに、フレームIDと共に返される。
+    """
+
+    def __init__(self, num_workers, tiles=1, tile_overlap=32, max_in_flight=1,
+                 backend_name="pyzbar", barcode_types=("CODE39",), stall_timeout=5.0):
+        self.num_workers = max(1, int(num_workers))
+        self.tiles = max(1, int(tiles))
+        self.tile_overlap = max(0, int(tile_overlap))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.stall_timeout = stall_timeout  # ワーカーからの応答をこの秒数待っても来なければ、そのフレームを諦める
+        self.stalled_count = 0  # 応答がなく諦めたフレーム数
+
+        ctx = mp.get_context("spawn")  # スレッドを持つ親プロセスからでも安全に起動できるようspawnを使用
+        self._task_queue = ctx.Queue()
+        self._result_queue = ctx.Queue()
+        self._workers = [
+            ctx.Process(target=_decode_worker, args=(self._task_queue, self._result_queue, backend_name, tuple(barcode_types)),
+                        daemon=True)
+            for _ in range(self.num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self._shape = None
+        self._slots = []  # 共有メモリのスロット
+        self._free_slots = deque()
+        self._pending = {}  # frame_id -> {"slot", "remaining", "tiles", "results"}
+        self._order = deque()  # 投入順のframe_id
+        self._closed = False
+
+    def _allocate_slots(self, shape):
+        """画像サイズに合わせて共有メモリのスロットを確保する"""
+        self._release_slots()
+        size = int(np.prod(shape))
+        self._slots = [shared_memory.SharedMemory(create=True, size=size) for _ in range(self.max_in_flight)]
+        self._free_slots = deque(range(len(self._slots)))
+        self._shape = tuple(shape)
+
+    def _release_slots(self):
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._slots = []
+        self._free_slots.clear()
+
+    def _tile_rects(self, shape):
+        """画像を横長の短冊に分割する。1次元バーコードが横幅全体に収まるよう、幅は分割しない。"""
+        height, width = shape[:2]
+        tile_height = -(-height // self.tiles)  # 切り上げ
+        rects = []
+        for i in range(self.tiles):
+            y0 = max(0, i * tile_height - self.tile_overlap)
+            y1 = min(height, (i + 1) * tile_height + self.tile_overlap)
+            if y0 < y1:
+                rects.append((y0, y1, 0, width))
+        return rects
+
+    def submit(self, frame_id, gray):
+        """
+        フレームをデコード待ちに投入する。空きスロットがない場合は、
+        先行フレームの結果が返るまで待つ（フレームは破棄しない）。
+        """
+        if self._closed:
+            raise RuntimeError("DecodePool は既に終了しています。")
+        if self._shape != gray.shape:
+            # 処理中のフレームがあれば、スロットを作り直す前に全て回収する
+            while self._order:
+                self._collect(block=True)
+            self._allocate_slots(gray.shape)
+        while not self._free_slots:
+            self._collect(block=True)
+
+        slot_index = self._free_slots.popleft()
+        shm = self._slots[slot_index]
+        np.copyto(np.ndarray(self._shape, dtype=np.uint8, buffer=shm.buf), gray)
+
+        rects = self._tile_rects(self._shape)
+        self._pending[frame_id] = {
+            "slot": slot_index,
+            "remaining": len(rects),
+            "tiles": rects,
+            "results": [None] * len(rects),
+        }
+        self._order.append(frame_id)
+        for tile_index, rect in enumerate(rects):
+            self._task_queue.put((frame_id, tile_index, shm.name, self._shape, rect))
+
+    def _collect(self, block):
+        """
+        ワーカーから結果を1件受け取る。受け取れた場合はTrueを返す。
+        block=True で stall_timeout 秒待っても応答がない場合は、最も古い未完了のフレームを諦めてTrueを返す。
+        """
+        try:
+            frame_id, tile_index, barcodes = self._result_queue.get(block=block, timeout=self.stall_timeout if block else None)
+        except queue.Empty:
+            if block:
+                self._drop_stalled_frame()
+                return True
+            return False
+        entry = self._pending.get(frame_id)
+        if entry is not None and entry["remaining"] > 0:  # 応答がなく諦めたフレームの結果は無視する
+            entry["results"][tile_index] = barcodes
+            entry["remaining"] -= 1
+            if entry["remaining"] == 0:
+                self._free_slots.append(entry["slot"])
+        return True
+
+    def _drop_stalled_frame(self):
+        """
+        応答のないフレームを、届いていないタイルの結果を空として完了扱いにし、スロットを解放する。
+        例外で止めずに次のフレームのデコードを続けるため (遅れて届いた結果は無視される)。
+        """
+        for frame_id in self._order:
+            entry = self._pending[frame_id]
+            if entry["remaining"] == 0:
+                continue
+            print(
+                f"警告: デコードワーカーから {self.stall_timeout:.1f} 秒応答がないため、"
+                f"フレーム {frame_id} の残り {entry['remaining']} タイルの結果を破棄します。"
+            )
+            entry["results"] = [result if result is not None else [] for result in entry["results"]]
+            entry["remaining"] = 0
+            self._free_slots.append(entry["slot"])
+            self.stalled_count += 1
+            return
+
+    def results(self, block=False):
+        """
+        デコードが完了したフレームを投入順に返す。
+        戻り値: [(frame_id, [((y0, y1, x0, x1), barcodes), ...]), ...]
+        block=True の場合は、投入済みのフレームが全て完了するまで待つ。
+        """
+        while self._collect(block=False):
+            pass
+        if block:
+            while any(self._pending[fid]["remaining"] for fid in self._order):
+                self._collect(block=True)
+
+        completed = []
+        while self._order and self._pending[self._order[0]]["remaining"] == 0:
+            frame_id = self._order.popleft()
+            entry = self._pending.pop(frame_id)
+            completed.append((frame_id, list(zip(entry["tiles"], entry["results"]))))
+        return completed
+
+    def decode(self, frame_id, gray):
+        """フレームを投入し、その結果が返るまで待つ（同期呼び出し用）"""
+        self.submit(frame_id, gray)
+        return self.results(block=True)
+
+    def close(self):
+        """ワーカープロセスを停止し、共有メモリを解放する"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=2.0)
+            if worker.is_alive():
+                worker.terminate()
+        self._release_slots()
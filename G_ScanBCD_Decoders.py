@@ -0,0 +1,303 @@
+# G_ScanBCD_Decoders.py
+# バーコードデコーダーのバックエンド (pyzbar / OpenCV / zxing-cpp) を共通の形式で扱うためのモジュール
+
+import glob
+import os
+import time
+from collections import namedtuple
+
+import cv2
+
+# 全てのバックエンドが返す共通の結果型 (pyzbar の Decoded と同じフィールド構成)
+Rect = namedtuple("Rect", "left top width height")
+Point = namedtuple("Point", "x y")
+DecodedBarcode = namedtuple("DecodedBarcode", "data type rect polygon quality orientation")
+
+
+def _make_barcode(data, barcode_type, points, quality=1, orientation=None):
+    """四隅の座標から共通形式のデコード結果を作成する"""
+    polygon = [Point(int(round(x)), int(round(y))) for x, y in points]
+    xs = [p.x for p in polygon] or [0]
+    ys = [p.y for p in polygon] or [0]
+    rect = Rect(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+    return DecodedBarcode(data, barcode_type, rect, polygon, quality, orientation)
+
+
+class PyzbarDecoder:
+    """pyzbar (ZBar) によるデコード"""
+
+    name = "pyzbar"
+
+    @staticmethod
+    def is_available():
+        try:
+            import pyzbar.pyzbar  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def __init__(self, barcode_types):
+        from pyzbar.pyzbar import decode, ZBarSymbol
+
+        self._decode = decode
+        symbols = []
+        for name in barcode_types:
+            try:
+                symbols.append(ZBarSymbol[name])
+            except KeyError:
+                print(f"警告: 未対応のバーコードタイプ '{name}' は読み取り対象から除外されます。")
+        self.symbols = symbols or None
+
+    def decode(self, gray):
+        results = []
+        for barcode in self._decode(gray, symbols=self.symbols):
+            results.append(DecodedBarcode(
+                barcode.data,
+                barcode.type,
+                Rect(*barcode.rect),
+                [Point(*p) for p in barcode.polygon],
+                getattr(barcode, "quality", 1),
+                getattr(barcode, "orientation", None),
+            ))
+        return results
+
+
+class OpenCVDecoder:
+    """OpenCV の cv2.barcode.BarcodeDetector によるデコード"""
+
+    name = "opencv"
+
+    @staticmethod
+    def is_available():
+        return hasattr(cv2, "barcode") and hasattr(cv2.barcode, "BarcodeDetector")
+
+    def __init__(self, barcode_types):
+        self.detector = cv2.barcode.BarcodeDetector()
+        self.barcode_types = set(barcode_types)
+
+    def decode(self, gray):
+        ok, infos, types, corners = self.detector.detectAndDecodeWithType(gray)
+        if not ok or corners is None:
+            return []
+        results = []
+        for info, barcode_type, points in zip(infos, types, corners):
+            if not info:
+                continue  # 位置は検出できたがデコードできなかった
+            barcode_type = barcode_type.replace("_", "").replace("-", "")  # "CODE_39" -> "CODE39"
+            if barcode_type not in self.barcode_types:
+                continue
+            results.append(_make_barcode(info.encode("utf-8"), barcode_type, points))
+        return results
+
+
+class ZxingCppDecoder:
+    """zxing-cpp によるデコード (インストールされている場合のみ使用可能)"""
+
+    name = "zxing"
+
+    # 設定上のバーコードタイプ名 (pyzbarの名称) と zxing-cpp のフォーマット名の対応
+    FORMAT_NAMES = {
+        "CODE39": "Code39",
+        "CODE93": "Code93",
+        "CODE128": "Code128",
+        "CODABAR": "Codabar",
+        "EAN8": "EAN8",
+        "EAN13": "EAN13",
+        "UPCA": "UPCA",
+        "UPCE": "UPCE",
+        "I25": "ITF",
+        "DATABAR": "DataBar",
+        "DATABAR_EXP": "DataBarExpanded",
+        "PDF417": "PDF417",
+        "QRCODE": "QRCode",
+    }
+
+    @staticmethod
+    def is_available():
+        try:
+            import zxingcpp  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def __init__(self, barcode_types):
+        import zxingcpp
+
+        self._zxingcpp = zxingcpp
+        self._type_names = {}
+        formats = None
+        for name in barcode_types:
+            format_name = self.FORMAT_NAMES.get(name)
+            if format_name is None or not hasattr(zxingcpp.BarcodeFormat, format_name):
+                print(f"警告: zxing-cpp はバーコードタイプ '{name}' に対応していません。")
+                continue
+            barcode_format = getattr(zxingcpp.BarcodeFormat, format_name)
+            self._type_names[format_name] = name
+            formats = barcode_format if formats is None else formats | barcode_format
+        self.formats = formats
+
+    def decode(self, gray):
+        if self.formats is None:
+            found = self._zxingcpp.read_barcodes(gray)
+        else:
+            found = self._zxingcpp.read_barcodes(gray, formats=self.formats)
+        results = []
+        for barcode in found:
+            format_name = barcode.format.name
+            position = barcode.position
+            points = [
+                (position.top_left.x, position.top_left.y),
+                (position.top_right.x, position.top_right.y),
+                (position.bottom_right.x, position.bottom_right.y),
+                (position.bottom_left.x, position.bottom_left.y),
+            ]
+            results.append(_make_barcode(
+                barcode.text.encode("utf-8"),
+                self._type_names.get(format_name, format_name.upper()),
+                points,
+                orientation=getattr(barcode, "orientation", None),
+            ))
+        return results
+
+
+# 全てのバックエンドで名前の通じるバーコードタイプ (読み取りテストツールで全種類を検出する場合に使用)
+ALL_BARCODE_TYPES = tuple(ZxingCppDecoder.FORMAT_NAMES)
+
+DECODER_BACKENDS = {
+    PyzbarDecoder.name: PyzbarDecoder,
+    OpenCVDecoder.name: OpenCVDecoder,
+    ZxingCppDecoder.name: ZxingCppDecoder,
+}
+
+
+def available_backends():
+    """このPCで使用可能なバックエンド名のリストを返す"""
+    return [name for name, backend in DECODER_BACKENDS.items() if backend.is_available()]
+
+
+def create_backend(name, barcode_types):
+    """名前を指定してバックエンドを作成する"""
+    backend = DECODER_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"不明なデコーダーバックエンドです: {name}")
+    if not backend.is_available():
+        raise ImportError(f"デコーダーバックエンド '{name}' はこのPCでは使用できません。")
+    return backend(barcode_types)
+
+
+def _load_calibration_samples(sample_dir):
+    """
+    キャリブレーション用のサンプル画像を読み込む。
+    ファイル名の先頭 ("_" まで) を期待値とする (例: 1234567890_01.png)。
+    """
+    samples = []
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*"))):
+        if os.path.splitext(path)[1].lower() not in (".png", ".jpg", ".jpeg", ".bmp"):
+            continue
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            continue
+        expected = os.path.basename(path).split("_")[0].split(".")[0]
+        samples.append((expected.encode("utf-8"), image))
+    return samples
+
+
+# サンプル画像を自動生成するときに使う劣化条件 (実際のスキャンで読めるべき程度のもの)
+CALIBRATION_CASES = ("clean", "blur", "noise", "perspective", "small", "dark", "bright")
+
+
+def generate_calibration_samples(sample_dir, barcode_types, length=10, per_case=2, seed=0):
+    """
+    キャリブレーション用のサンプル画像がない場合に、合成した CODE39 ラベルの画像をフォルダに書き出す。
+    CODE39 が読み取り対象でない場合は何もしない。書き出した枚数を返す。
+    """
+    if "CODE39" not in barcode_types:
+        return 0
+    import numpy as np
+    from benchmarks.code39 import DISTORTION_CASES, distort, random_digits, render_code39
+
+    os.makedirs(sample_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    count = 0
+    for case in CALIBRATION_CASES:
+        for _ in range(per_case):
+            expected = random_digits(rng, length)
+            image = distort(render_code39(expected, narrow=int(rng.integers(2, 4))), rng, **DISTORTION_CASES[case])
+            cv2.imwrite(os.path.join(sample_dir, f"{expected}_{case}.png"), cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+            count += 1
+    return count
+
+
+def calibrate_backends(config, barcode_types):
+    """
+    使用可能な各バックエンドでサンプル画像をデコードし、処理時間と正解率を計測する。
+    戻り値: [{"name", "accuracy", "ms_per_image"}, ...]
+    """
+    sample_dir = config.get("decoder_calibration_dir", "calibration")
+    rounds = max(1, int(config.get("decoder_calibration_rounds", 3)))
+    samples = _load_calibration_samples(sample_dir)
+    if not samples:
+        # 初回はサンプル画像を合成して書き出す (実際のラベルの写真に置き換えてもよい)
+        length = int(config.get("expected_length", 10) or 10)
+        if generate_calibration_samples(sample_dir, barcode_types, length):
+            print(f"INFO: キャリブレーション用のサンプル画像を '{sample_dir}' に作成しました。")
+            samples = _load_calibration_samples(sample_dir)
+    if not samples:
+        print(f"警告: キャリブレーション用のサンプル画像が '{sample_dir}' に見つかりません。")
+        return []
+
+    results = []
+    for name in available_backends():
+        try:
+            backend = create_backend(name, barcode_types)
+        except Exception as e:
+            print(f"デコーダー '{name}' の初期化に失敗しました: {e}")
+            continue
+        correct = 0
+        start_time = time.perf_counter()
+        for round_index in range(rounds):
+            for expected, image in samples:
+                try:
+                    decoded = backend.decode(image)
+                except Exception:
+                    decoded = []
+                if round_index == 0 and any(barcode.data == expected for barcode in decoded):
+                    correct += 1
+        elapsed = time.perf_counter() - start_time
+        results.append({
+            "name": name,
+            "accuracy": correct / len(samples),
+            "ms_per_image": elapsed * 1000 / (len(samples) * rounds),
+        })
+    return results
+
+
+def create_decoder(config, barcode_types):
+    """
+    config の decoder_backend に従ってデコーダーを作成する。
+    "auto" の場合は、正解率が decoder_min_accuracy 以上のバックエンドのうち最も速いものを選ぶ。
+    """
+    name = config.get("decoder_backend", "pyzbar")
+
+    if name == "auto":
+        min_accuracy = config.get("decoder_min_accuracy", 0.95)
+        results = calibrate_backends(config, barcode_types)
+        for result in results:
+            print(
+                f"  デコーダー {result['name']}: 正解率 {result['accuracy'] * 100:.1f}%, "
+                f"{result['ms_per_image']:.2f} ms/枚"
+            )
+        qualified = [r for r in results if r["accuracy"] >= min_accuracy]
+        if qualified:
+            name = min(qualified, key=lambda r: r["ms_per_image"])["name"]
+        else:
+            if results:
+                print(f"警告: 正解率 {min_accuracy * 100:.0f}% を満たすデコーダーがないため、pyzbar を使用します。")
+            name = PyzbarDecoder.name
+        print(f"INFO: デコーダー '{name}' を使用します。")
+
+    try:
+        return create_backend(name, barcode_types)
+    except (ValueError, ImportError) as e:
+        print(f"警告: {e} pyzbar を使用します。")
+        return create_backend(PyzbarDecoder.name, barcode_types)
@@ -0,0 +1,396 @@
+# G_ScanBCD_Engine.py
+# フレーム取得 → デコード → 検証 → 重複チェックの共通処理 (各スキャンツールで共有する)
+
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from G_ScanBCD_Analyzer import G_ScanBCD_Analyzer, get_barcode_types
+from G_ScanBCD_Confirmer import ReadConfirmer
+from G_ScanBCD_DataCollector import G_ScanBCD_DataCollector
+from G_ScanBCD_FrameGrabber import FrameGrabber
+from G_ScanBCD_FrameSource import is_live_source, ReplayReport
+from G_ScanBCD_Instrumentation import LatencyRecorder
+from G_ScanBCD_Pacing import DisplayClock, PacingGovernor
+
+# 受け付けた (または重複・不正と判定した) 1件のバーコード
+# data: デコードした文字列, timestamp: 検出時刻 (YYYYMMDD-HHMMSS), source: カメラ名, barcode: デコード結果
+ScanEvent = namedtuple("ScanEvent", "data type timestamp source barcode")
+
+
+def get_current_timestamp():
+    """現在時刻を 'YYYYMMDD-HHMMSS' 形式の文字列で返す"""
+    return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+class CsvSink:
+    """受け付けたスキャンを G_ScanBCD_CsvWriter で data/{工事番号}.csv に書き込む"""
+
+    def __init__(self, csv_writer, location, construction_number, worker_name):
+        self.csv_writer = csv_writer
+        self.data_collector = G_ScanBCD_DataCollector()
+        self.location = location
+        self.construction_number = construction_number
+        self.worker_name = worker_name
+
+    def write(self, event):
+        data = self.data_collector.collect(
+            event.data,
+            event.type,
+            event.timestamp,
+            self.location,
+            self.construction_number,
+            self.worker_name,
+        )
+        self.csv_writer.write(data)
+
+
+class ProcessCsvSink:
+    """受け付けたスキャンを G_ProcessCsvWriter で工程CSVに書き込む"""
+
+    def __init__(self, csv_writer):
+        self.csv_writer = csv_writer
+
+    def write(self, event):
+        self.csv_writer.write(event.data, event.type, event.timestamp)
+
+
+class ScanEngine:
+    """
+    カメラ (または再生ソース) からフレームを取得してデコードし、
+    バーコードの検証 (種類・桁数) と重複チェックを行う共通エンジン。
+
+    結果はコールバックで通知する:
+      on_valid_scan(event) / on_duplicate(event) / on_invalid(event) / on_idle_timeout()
+    受け付けたスキャンは sinks (write(event) を持つオブジェクト) にも順に渡される。
+    """
+
+    def __init__(self, config, analyzer=None, sinks=None, on_valid_scan=None, on_duplicate=None,
+                 on_invalid=None, on_idle_timeout=None):
+        self.config = config
+        self.expected_length = self.config.get("expected_length")
+        self.target_fps = self.config.get("target_fps", 30)
+        self.auto_stop = self.config.get("auto_stop", False)
+        self.idle_timeout = self.config.get("idle_timeout", 300)
+
+        # 外部から渡されたアナライザーは呼び出し元で閉じる
+        # (渡されなかった場合は、デコードで初めて必要になったときに作成する。検証だけに使う場合は作成しない)
+        self._owns_analyzer = analyzer is None
+        self._analyzer = analyzer
+        self.barcode_types = get_barcode_types(config)
+
+        # 同じ値が confirm_window_ms 以内に confirm_reads 回読めてから受け付ける (1 の場合は即時)
+        self.confirmer = ReadConfirmer.from_config(config)
+        self.sinks = list(sinks or [])
+        self.on_valid_scan = on_valid_scan
+        self.on_duplicate = on_duplicate
+        self.on_invalid = on_invalid
+        self.on_idle_timeout = on_idle_timeout
+
+        self.sources = []
+        self.replay_report = None
+        # 処理段階ごとの所要時間 (capture / capture_wait / decode / csv / frame と、呼び出し元が記録する overlay / imshow など)
+        self.latency = LatencyRecorder.from_config(config)
+        self._running = False
+
+        # スキャン状態 (全ソースで共有)
+        self.scanned_barcodes = []  # 受け付けたバーコード (受付順)
+        self._scanned_set = set()
+        self.scan_count = 0
+        self.success_count = 0
+        self.failure_count = 0
+        self.duplicate_count = 0
+        self.last_scan_time = time.time()
+
+        # フレームレート制御 (動きもバーコードもない間は pacing_idle_fps に落とす)
+        self.governor = PacingGovernor.from_config(config)
+        # 画面表示の更新周期 (表示はデコードとは別に preview_fps で更新する。全ウィンドウで共有)
+        self.display_clock = DisplayClock.from_config(config)
+
+    @property
+    def analyzer(self):
+        """フレームソースの既定のアナライザー"""
+        if self._analyzer is None:
+            self._analyzer = G_ScanBCD_Analyzer(self.config)
+        return self._analyzer
+
+    # --- フレームソース ---
+
+    def add_source(self, cap, name=None, analyzer=None):
+        """
+        フレームソースを追加し、専用のキャプチャスレッドを開始する。
+        ソースごとの状態 (アナライザー・統計) を持つ辞書を返す。呼び出し元で任意のキーを追加してよい。
+        """
+        live = is_live_source(cap)
+        source = {
+            "name": len(self.sources) if name is None else name,
+            "cap": cap,
+            "live": live,
+            # デコードが遅れても常に最新フレームを処理する (再生時は全フレームを順に処理する)
+            "grabber": FrameGrabber(
+                cap, self.config.get("capture_buffer_size", 2), drop_frames=live, latency=self.latency,
+                reuse_buffers=self.config.get("frame_buffer_reuse", True),
+            ).start(),
+            "analyzer": analyzer if analyzer is not None else self.analyzer,
+            "stats": {"frames": 0, "success": 0, "duplicate": 0, "failure": 0},
+        }
+        source["analyzer"].latency = self.latency  # グレースケール変換用バッファの確保を記録する
+        self.sources.append(source)
+        return source
+
+    @property
+    def live(self):
+        """全てのソースがカメラであればTrue"""
+        return all(source["live"] for source in self.sources)
+
+    @property
+    def source_stats(self):
+        """ソース名ごとの処理フレーム数・成功・重複・失敗数"""
+        return {source["name"]: source["stats"] for source in self.sources}
+
+    def read_frames(self, timeout=0.0):
+        """新しいフレームが届いているソースについて (source, frame) を順に返す"""
+        for source in self.sources:
+            wait_start = time.perf_counter()
+            with self.latency.measure("capture_wait"):
+                ret, frame = source["grabber"].read(timeout)
+            # フレームの到着待ちは処理時間に含めない (持続可能なフレームレートの測定に使うため)
+            self.governor.frame_waited(time.perf_counter() - wait_start)
+            if ret:
+                yield source, frame
+
+    @property
+    def ended(self):
+        """全てのソースの読み込みが終了していればTrue"""
+        return all(source["grabber"].ended for source in self.sources)
+
+    # --- フレームレート制御 ---
+
+    def begin_frame(self):
+        """フレーム処理の開始を記録し、次のフレームの開始予定時刻を決める"""
+        self.governor.frame_started()
+
+    def end_frame(self):
+        """フレーム処理 (取得・デコード・描画) の終了を記録する"""
+        self.governor.frame_finished()
+
+    def time_until_next_frame(self):
+        """次のフレームの開始予定時刻まで待つべき秒数 (再生時は待たない)"""
+        if not self.live:
+            return 0.0
+        return self.governor.time_until_next_frame()
+
+    def pace(self):
+        """次のフレームの開始予定時刻まで待ってから、フレーム処理の開始を記録する"""
+        wait = self.time_until_next_frame()
+        if wait > 0:
+            time.sleep(wait)
+        self.begin_frame()
+
+    def remaining_time(self):
+        """最後のスキャンから idle_timeout までの残り秒数"""
+        return max(0, self.idle_timeout - (time.time() - self.last_scan_time))
+
+    # --- デコードと検証 ---
+
+    def is_valid(self, barcode_info, barcode_type):
+        """読み取り対象の種類で、桁数が expected_length と一致すればTrue"""
+        return barcode_type in self.barcode_types and len(barcode_info) == self.expected_length
+
+    def step(self, frame, source=None):
+        """1フレームを解析し、検出したバーコードを検証・登録する。(barcodes, frame) を返す"""
+        analyzer = source["analyzer"] if source is not None else self.analyzer
+        if source is not None:
+            source["stats"]["frames"] += 1
+        # 確定待ちの値がある間は、静止したラベルも読み直せるよう動き検知による省略を行わない
+        # (motion_max_skip_seconds が confirm_window_ms より長いと、2回目を読む前に期限切れになるため)
+        force_decode = self.confirmer.has_pending()
+        with self.latency.measure("decode"):
+            barcodes, frame = analyzer.analyze(frame, force_decode=force_decode)
+        # 動き検知が無効の場合は動きの有無が分からないため、常に動きありとして扱う
+        self.governor.observe(bool(barcodes) or analyzer.motion_detected is not False)
+        self.handle_barcodes(barcodes, source)
+        return barcodes, frame
+
+    def handle_barcodes(self, barcodes, source=None):
+        """デコード結果を検証し、受け付けたスキャンの ScanEvent のリストを返す"""
+        if barcodes:
+            self.last_scan_time = time.time()
+
+        accepted = []
+        for barcode in barcodes:
+            # バーコードを検出した瞬間のタイムスタンプを取得
+            timestamp = get_current_timestamp()
+            barcode_info = barcode.data.decode("utf-8")
+            source_name = source["name"] if source is not None else None
+            event = ScanEvent(barcode_info, barcode.type, timestamp, source_name, barcode)
+
+            if not self.is_valid(barcode_info, barcode.type):
+                self.failure_count += 1  # 不正なバーコードのため失敗カウントを増やす
+                if source is not None:
+                    source["stats"]["failure"] += 1
+                if self.on_invalid:
+                    self.on_invalid(event)
+                continue
+
+            # 未登録の値は、確定するまで受け付けない (登録済みの値は重複としてそのまま数える)
+            if event.data not in self._scanned_set and not self.confirmer.observe(event.data):
+                continue
+
+            if self.record(event, source):
+                accepted.append(event)
+        return accepted
+
+    def record(self, event, source=None, notify=True):
+        """
+        重複チェックを行い、新しいバーコードであれば受け付けて sinks に書き込む。
+        手動登録など、検証済みのスキャンを登録する場合にも使用する (notify=False でコールバックを省略)。
+        受け付けた場合はTrue
+        """
+        if event.data in self._scanned_set:
+            self.duplicate_count += 1  # 重複したスキャン数を更新
+            if source is not None:
+                source["stats"]["duplicate"] += 1
+            if notify and self.on_duplicate:
+                self.on_duplicate(event)
+            return False
+
+        self._scanned_set.add(event.data)
+        self.scanned_barcodes.append(event.data)
+        self.scan_count += 1
+        self.success_count += 1
+        self.last_scan_time = time.time()  # アイドルタイムリセット
+        if source is not None:
+            source["stats"]["success"] += 1
+        with self.latency.measure("csv"):
+            for sink in self.sinks:
+                sink.write(event)
+        if notify and self.on_valid_scan:
+            self.on_valid_scan(event)
+        return True
+
+    # --- メインループ ---
+
+    def run(self, on_frame=None):
+        """
+        stop() が呼ばれるか、全ソースが終了するか、アイドルタイムアウトになるまでスキャンを続ける。
+        on_frame(source, frame, barcodes) はフレームごとに呼ばれ、画面表示や操作の受付に使用する。
+        """
+        if not self.live:
+            # 再生時は全フレームを処理し、終了時に処理性能を報告する
+            self.replay_report = ReplayReport()
+
+        # ソースが1つならフレームが届くまで待ち、複数なら届いているソースだけを順に処理する
+        read_timeout = 1.0 if len(self.sources) == 1 else 0.0
+        self._running = True
+        paced = False
+        while self._running:
+            # フレームが届くのを待っている間は、開始予定時刻を進めない
+            if not paced:
+                self.pace()
+                paced = True
+
+            processed = False
+            for source, frame in self.read_frames(read_timeout):
+                processed = True
+                if self.replay_report:
+                    self.replay_report.frame_started()
+                with self.latency.measure("frame"):
+                    barcodes, frame = self.step(frame, source)
+                    if on_frame:
+                        on_frame(source, frame, barcodes)
+                if self.replay_report:
+                    self.replay_report.frame_finished(len(barcodes))
+                if not self._running:
+                    break
+
+            if not processed:
+                if self.ended:
+                    break
+                sleep_start = time.perf_counter()
+                time.sleep(0.001)  # 新しいフレームがまだ届いていない
+                self.governor.frame_waited(time.perf_counter() - sleep_start)
+                continue
+            self.end_frame()
+            paced = False
+
+            # 一定時間バーコードが読み込まれなければ停止
+            if self.auto_stop and self.remaining_time() == 0:
+                if self.on_idle_timeout:
+                    self.on_idle_timeout()
+                break
+        self._running = False
+        # 先行投入中のフレームの結果も取りこぼさずに登録する
+        self.flush()
+
+    def flush(self):
+        """各アナライザーで先行投入中のフレームの結果を待ち、検証・登録する (ストリームの終わりと close() の前に呼ぶ)"""
+        flushed = set()
+        for source in self.sources:
+            analyzer = source["analyzer"]
+            if id(analyzer) in flushed:
+                continue
+            flushed.add(id(analyzer))
+            barcodes = analyzer.flush()
+            if barcodes:
+                self.handle_barcodes(barcodes, source)
+
+    def stop(self):
+        """run() のループを終了させる"""
+        self._running = False
+
+    def close(self):
+        """キャプチャを停止してカメラを解放し、エンジンが作成したアナライザーを閉じる"""
+        self.flush()
+        closed = set()
+        for source in self.sources:
+            source["grabber"].stop()
+            source["cap"].release()
+            analyzer = source["analyzer"]
+            if id(analyzer) not in closed and (analyzer is not self._analyzer or self._owns_analyzer):
+                analyzer.close()
+            closed.add(id(analyzer))
+        if self._owns_analyzer and self._analyzer is not None and id(self._analyzer) not in closed:
+            self._analyzer.close()
+
+    def log_stats(self, logger, extra=None):
+        """
+        ソースごとの解析統計とキャプチャ統計、再生統計、処理段階ごとの所要時間をログに記録する。
+        latency_dump_file が設定されていれば、所要時間の集計を JSON に書き出す (extra は JSON に追加する情報)。
+        """
+        for source in self.sources:
+            grabber_stats = source["grabber"].get_stats()
+            logger.info("解析統計 (%s): %s", source["name"], source["analyzer"].get_stats())
+            logger.info(
+                "キャプチャ統計 (%s): 取得 %d フレーム, 破棄 %d フレーム, 実測 %.1f FPS",
+                source["name"],
+                grabber_stats["captured"],
+                grabber_stats["dropped"],
+                grabber_stats["fps"],
+            )
+        if self.replay_report:
+            print(self.replay_report.format())
+            logger.info("再生統計: %s", self.replay_report.summary())
+        if self.live and self.governor.frame_count:
+            pacing = self.governor.get_stats()
+            print(
+                f"フレームレート: 目標 {pacing['target_fps']} FPS / 実測 {pacing['achieved_fps']} FPS "
+                f"(処理時間 {pacing['frame_cost_ms']} ms, 待機モード {pacing['idle_frame_ratio'] * 100:.0f}%)"
+            )
+            logger.info("フレームレート: %s", pacing)
+        if self.display_clock.update_count:
+            logger.info("画面表示: %s", self.display_clock.get_stats())
+        if self.confirmer.confirm_reads > 1:
+            logger.info("読み取り確定統計: %s", self.confirmer.get_stats())
+        if self.latency.enabled:
+            logger.info("処理時間: %s", self.latency.summary())
+            allocations = self.latency.allocation_summary()
+            if allocations:
+                logger.info("メモリ確保: %s", allocations)
+            dump_file = self.config.get("latency_dump_file", "")
+            if dump_file:
+                try:
+                    path = self.latency.dump_json(dump_file, extra)
+                    print(f"処理時間の集計を {path} に書き出しました。")
+                except OSError as e:
+                    print(f"警告: 処理時間の集計を書き出せませんでした: {e}")
@@ -0,0 +1,153 @@
+# G_ScanBCD_FrameGrabber.py
+# カメラからのフレーム取得を専用スレッドで行い、デコード処理と切り離すためのクラス
+
+import threading
+import time
+from collections import deque
+
+FPS_WINDOW = 30  # 実測FPSの計算に使う直近のフレーム数
+
+
+class FrameGrabber:
+    """
+    専用スレッドで cap.read() を回し続け、最新フレームを有界リングバッファに保持する。
+    バッファが一杯の場合は古いフレームを捨てる（最新フレーム優先）。
+    デコードが一時的に遅くなっても、カメラ側のバッファに古いフレームが溜まらない。
+    drop_frames=False の場合は、動画ファイルの再生などで全フレームを処理するため、
+    バッファに空きができるまで読み込みを待ち、フレームを古い順に返す。
+    reuse_buffers=True の場合は、破棄したフレームと読み終えたフレームの配列を cap.read(frame) で
+    使い回し、フレームごとに新しい配列を確保しない。read() で返したフレームは次の read() まで有効。
+    """
+
+    def __init__(self, cap, buffer_size=2, drop_frames=True, latency=None, reuse_buffers=True):
+        self.cap = cap
+        self.latency = latency  # LatencyRecorder (cap.read() の所要時間を "capture" として記録)
+        self.buffer_size = max(1, int(buffer_size))
+        self.drop_frames = drop_frames
+        self._buffer = deque(maxlen=self.buffer_size)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._ended = False  # カメラからの読み込みが失敗した（ストリーム終了）
+        self.reuse_buffers = reuse_buffers
+        self._free_frames = []  # 再利用できるフレームの配列
+        self._held_frame = None  # 直近に read() で返したフレーム (次の read() まで呼び出し元が使用中)
+
+        # 統計情報
+        self.captured_count = 0  # カメラから取得したフレーム数
+        self.dropped_count = 0  # 読まれずに上書きされたフレーム数
+        self.frame_id = -1  # 直近に read() で返したフレームのID
+        self.capture_time = 0.0  # 直近に read() で返したフレームの取得時刻
+        self._first_capture_time = None
+        self._last_capture_time = None
+        self._recent_capture_times = deque(maxlen=FPS_WINDOW)
+
+    def start(self):
+        """キャプチャスレッドを開始する"""
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def _capture_loop(self):
+        next_id = 0
+        while self._running:
+            with self._condition:
+                reusable = self._free_frames.pop() if self._free_frames else None
+            read_start = time.perf_counter()
+            ret, frame = self.cap.read(reusable) if reusable is not None else self.cap.read()
+            if self.latency is not None:
+                self.latency.record("capture", time.perf_counter() - read_start)
+                if ret and frame is not None and frame is not reusable:
+                    self.latency.record_allocation("capture", frame.nbytes)
+            if not ret:
+                with self._condition:
+                    self._ended = True
+                    self._condition.notify_all()
+                break
+
+            with self._condition:
+                if not self.drop_frames:
+                    self._condition.wait_for(lambda: len(self._buffer) < self.buffer_size or not self._running)
+                    if not self._running:
+                        break
+                if len(self._buffer) == self.buffer_size:
+                    self.dropped_count += 1  # maxlenにより最古のフレームが捨てられる
+                    self._recycle(self._buffer[0][2])
+                now = time.time()
+                self._buffer.append((next_id, now, frame))
+                self.captured_count += 1
+                if self._first_capture_time is None:
+                    self._first_capture_time = now
+                self._last_capture_time = now
+                self._recent_capture_times.append(now)
+                self._condition.notify_all()
+            next_id += 1
+
+    def read(self, timeout=1.0):
+        """
+        最新のフレームを取得する。cv2.VideoCapture.read() と同じ (ret, frame) を返す。
+        新しいフレームが届くまで最大 timeout 秒待つ。
+        """
+        with self._condition:
+            if not self._buffer and not self._ended:
+                self._condition.wait_for(lambda: self._buffer or self._ended, timeout)
+            if not self._buffer:
+                return False, None
+
+            if self.drop_frames:
+                # 最新のフレームだけを使い、残りは破棄する
+                frame_id, capture_time, frame = self._buffer.pop()
+                self.dropped_count += len(self._buffer)
+                for _, _, dropped in self._buffer:
+                    self._recycle(dropped)
+                self._buffer.clear()
+            else:
+                frame_id, capture_time, frame = self._buffer.popleft()
+                self._condition.notify_all()  # 空きができたことをキャプチャスレッドに通知
+            # 前回返したフレームは呼び出し元が使い終えたので、次の読み込みに使い回す
+            self._recycle(self._held_frame)
+            self._held_frame = frame
+
+        self.frame_id = frame_id
+        self.capture_time = capture_time
+        return True, frame
+
+    def _recycle(self, frame):
+        """使い終えたフレームの配列を再利用リストに戻す (self._condition を保持した状態で呼ぶ)"""
+        if not self.reuse_buffers or frame is None or len(self._free_frames) >= self.buffer_size + 1:
+            return
+        self._free_frames.append(frame)
+
+    @property
+    def ended(self):
+        """カメラからの読み込みが終了（失敗）していればTrue"""
+        return self._ended
+
+    def stop(self):
+        """キャプチャスレッドを停止する（カメラの解放は呼び出し元で行う）"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    @property
+    def current_fps(self):
+        """直近 FPS_WINDOW フレームから求めたカメラの実測FPS"""
+        times = list(self._recent_capture_times)
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def get_stats(self):
+        """取得・破棄したフレーム数と、取得開始からの平均FPSを返す"""
+        elapsed = (self._last_capture_time or 0.0) - (self._first_capture_time or 0.0)
+        return {
+            "captured": self.captured_count,
+            "dropped": self.dropped_count,
+            "fps": (self.captured_count - 1) / elapsed if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,183 @@
+# G_ScanBCD_FrameSource.py
+# カメラの代わりに動画ファイルや画像フォルダからフレームを供給するためのモジュール
+# (カメラのないPCでスキャナの性能を再現性をもって計測するために使用する)
+
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from G_ScanBCD_Camera import open_camera
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class _ReplaySource:
+    """
+    再生用フレームソースの基底クラス。cv2.VideoCapture と同じ
+    isOpened() / read() / set() / get() / release() を持つ。
+    realtime=True の場合は記録時のフレームレートに合わせて read() を待たせる。
+    """
+
+    is_live = False  # カメラではない（全フレームを取りこぼさず処理する）
+
+    def __init__(self, fps, realtime):
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.realtime = realtime
+        self._start_time = None
+        self._frame_index = 0
+
+    def _pace(self):
+        """記録時の速度で再生する場合、次のフレームの表示時刻まで待つ"""
+        if not self.realtime:
+            return
+        if self._start_time is None:
+            self._start_time = time.perf_counter()
+        wait = self._start_time + self._frame_index / self.fps - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+
+    def set(self, prop_id, value):
+        return False  # 再生時は解像度などの設定を変更できない
+
+    def get(self, prop_id):
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0
+
+
+class VideoFileSource(_ReplaySource):
+    """動画ファイル (.mp4 / .avi など) からフレームを読み込む"""
+
+    def __init__(self, path, realtime=False):
+        self._cap = cv2.VideoCapture(path)
+        super().__init__(self._cap.get(cv2.CAP_PROP_FPS), realtime)
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def read(self, image=None):
+        self._pace()
+        ret, frame = self._cap.read(image) if image is not None else self._cap.read()
+        self._frame_index += 1
+        return ret, frame
+
+    def get(self, prop_id):
+        return self._cap.get(prop_id)
+
+    def release(self):
+        self._cap.release()
+
+
+class ImageFolderSource(_ReplaySource):
+    """フォルダ内の画像をファイル名順に1フレームずつ読み込む"""
+
+    def __init__(self, folder, fps=30.0, realtime=False):
+        super().__init__(fps, realtime)
+        self.paths = sorted(
+            path for path in glob.glob(os.path.join(folder, "*"))
+            if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+        )
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self, image=None):
+        if self._frame_index >= len(self.paths):
+            return False, None
+        self._pace()
+        frame = cv2.imread(self.paths[self._frame_index], cv2.IMREAD_COLOR)
+        self._frame_index += 1
+        if frame is None:
+            print(f"警告: 画像を読み込めませんでした: {self.paths[self._frame_index - 1]}")
+            return self.read(image)
+        return True, frame
+
+    def get(self, prop_id):
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.paths)
+        return super().get(prop_id)
+
+    def release(self):
+        self.paths = []
+
+
+def open_frame_source(config, source=None, realtime=None, camera_index=None):
+    """
+    フレームソースを開く。source (または config の replay_source) が指定されていれば
+    動画ファイルか画像フォルダを再生し、指定がなければカメラ (camera_index、
+    省略時は config の camera_index) を開く。
+    """
+    source = source or config.get("replay_source")
+    if realtime is None:
+        realtime = config.get("replay_realtime", False)
+
+    if not source:
+        if camera_index is None:
+            camera_index = config.get("camera_index", 0)
+            if isinstance(camera_index, (list, tuple)):
+                camera_index = camera_index[0]  # 複数台指定時は1台目
+        return open_camera(config, camera_index)
+
+    if os.path.isdir(source):
+        print(f"画像フォルダを再生します: {source}")
+        return ImageFolderSource(source, fps=config.get("target_fps", 30), realtime=realtime)
+    print(f"動画ファイルを再生します: {source}")
+    return VideoFileSource(source, realtime=realtime)
+
+
+def is_live_source(cap):
+    """カメラ（実時間で新しいフレームが届くソース）であればTrueを返す"""
+    return getattr(cap, "is_live", True)
+
+
+class ReplayReport:
+    """再生時の処理フレーム数・スループット・1フレームあたりの処理時間を集計する"""
+
+    def __init__(self):
+        self.start_time = None
+        self.end_time = None
+        self.latencies = []  # フレーム取得から処理完了までの秒数
+        self.barcode_count = 0
+        self._frame_start = None
+
+    def frame_started(self):
+        now = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = now
+        self._frame_start = now
+
+    def frame_finished(self, barcode_count=0):
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            self.latencies.append(now - self._frame_start)
+            self._frame_start = None
+        self.barcode_count += barcode_count
+        self.end_time = now
+
+    def summary(self):
+        """集計結果を辞書で返す"""
+        frames = len(self.latencies)
+        elapsed = (self.end_time - self.start_time) if frames else 0.0
+        latencies_ms = np.array(self.latencies) * 1000 if frames else np.zeros(1)
+        return {
+            "frames": frames,
+            "elapsed_s": round(elapsed, 3),
+            "fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+            "barcodes": self.barcode_count,
+            "latency_mean_ms": round(float(latencies_ms.mean()), 2),
+            "latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+            "latency_p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+            "latency_max_ms": round(float(latencies_ms.max()), 2),
+        }
+
+    def format(self):
+        """集計結果を表示用の文字列で返す"""
+        s = self.summary()
+        return (
+            f"再生結果: {s['frames']} フレーム / {s['elapsed_s']} 秒 ({s['fps']} FPS), "
+            f"検出 {s['barcodes']} 件, 処理時間 平均 {s['latency_mean_ms']} ms, "
+            f"p50 {s['latency_p50_ms']} ms, p95 {s['latency_p95_ms']} ms, 最大 {s['latency_max_ms']} ms"
+        )
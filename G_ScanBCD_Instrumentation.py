@@ -0,0 +1,133 @@
+# G_ScanBCD_Instrumentation.py
+# スキャンループの各処理 (取得・デコード・描画・表示・CSV書き込み) の所要時間と、
+# フレームごとのメモリ確保 (画像バッファの新規確保) を計測するためのモジュール
+
+import json
+import math
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def _percentile(sorted_values, percent):
+    """昇順に並んだ値から、最近傍順位法でパーセンタイル値を求める"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LatencyRecorder:
+    """
+    処理段階 (stage) ごとに直近 window 件の所要時間を保持し、p50/p95/p99 を集計する。
+    time.perf_counter() による単調増加の時刻で計測する。enabled=False の場合は何も記録しない。
+    """
+
+    def __init__(self, window=1000, enabled=True):
+        self.window = max(1, int(window))
+        self.enabled = enabled
+        self._samples = {}  # stage -> 直近の所要時間 (秒)
+        self._counts = {}  # stage -> 累計回数
+        self._allocations = {}  # stage -> [確保回数, 確保バイト数]
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            window=config.get("latency_window", 1000),
+            enabled=config.get("latency_instrumentation", True),
+        )
+
+    def record(self, stage, seconds):
+        """1回分の所要時間 (秒) を記録する"""
+        if not self.enabled:
+            return
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window)
+            self._counts[stage] = 0
+        samples.append(seconds)
+        self._counts[stage] += 1
+
+    def record_allocation(self, stage, nbytes):
+        """再利用できずに新しく確保した画像バッファを記録する"""
+        if not self.enabled:
+            return
+        entry = self._allocations.setdefault(stage, [0, 0])
+        entry[0] += 1
+        entry[1] += int(nbytes)
+
+    @contextmanager
+    def measure(self, stage):
+        """with ブロックの所要時間を stage として記録する"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self):
+        """stage ごとの回数と所要時間 (ミリ秒) の統計を辞書で返す"""
+        result = {}
+        for stage, samples in list(self._samples.items()):
+            values = sorted(samples)
+            if not values:
+                continue
+            result[stage] = {
+                "count": self._counts[stage],
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(_percentile(values, 50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 95) * 1000, 2),
+                "p99_ms": round(_percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        return result
+
+    def allocation_summary(self):
+        """
+        stage ごとのメモリ確保の回数・バイト数と、1フレームあたりの平均を辞書で返す。
+        フレーム数には "frame" (なければ "decode") の計測回数を使う。
+        """
+        frames = self._counts.get("frame") or self._counts.get("decode", 0)
+        return {
+            stage: {
+                "count": count,
+                "bytes": nbytes,
+                "per_frame_count": round(count / frames, 3) if frames else 0.0,
+                "per_frame_bytes": round(nbytes / frames) if frames else 0,
+            }
+            for stage, (count, nbytes) in list(self._allocations.items())
+        }
+
+    def format(self):
+        """集計結果を stage ごとに1行の文字列で返す"""
+        lines = [
+            f"{stage}: p50 {s['p50_ms']} ms / p95 {s['p95_ms']} ms / p99 {s['p99_ms']} ms ({s['count']} 回)"
+            for stage, s in self.summary().items()
+        ]
+        lines.extend(
+            f"{stage} のメモリ確保: {a['per_frame_count']} 回 / {a['per_frame_bytes']} バイト (1フレームあたり)"
+            for stage, a in self.allocation_summary().items()
+        )
+        return "\n".join(lines)
+
+    def dump_json(self, path, extra=None):
+        """
+        集計結果を JSON ファイルに書き出す。path の {timestamp} は現在時刻に置き換えられる。
+        書き出したファイルのパスを返す。
+        """
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = path.format(timestamp=timestamp)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        report = {"timestamp": timestamp, "stages": self.summary(), "allocations": self.allocation_summary()}
+        if extra:
+            report.update(extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+        return path
@@ -0,0 +1,77 @@
+# G_ScanBCD_MotionDetector.py
+# 縮小したグレースケール画像の差分から、画面に変化があったかどうかを判定するクラス
+
+import time
+
+import cv2
+
+
+class MotionDetector:
+    """
+    最後にデコードしたフレームと現在のフレームを縮小画像で比較し、
+    変化がなければデコードを省略してよいと判定する。
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.downscale_width = max(16, int(self.config.get("motion_downscale_width", 80)))
+        self.pixel_threshold = self.config.get("motion_pixel_threshold", 15)  # 変化とみなす画素値の差
+        self.changed_ratio_threshold = self.config.get("motion_changed_ratio", 0.01)  # 変化とみなす画素の割合
+        # 変化がなくてもこの秒数が経過したらデコードする (0以下で無効)
+        self.max_skip_seconds = self.config.get("motion_max_skip_seconds", 1.0)
+
+        self._reference = None  # 最後にデコードしたフレームの縮小画像
+        self._reference_time = 0.0
+
+        # 統計情報
+        self.checked_count = 0
+        self.skipped_count = 0
+        self.last_changed_ratio = 0.0
+        self.last_motion = False  # 直近の判定で動きがあったか
+
+    def _downscale(self, gray):
+        height, width = gray.shape[:2]
+        small_height = max(1, int(height * self.downscale_width / width))
+        small = cv2.resize(gray, (self.downscale_width, small_height), interpolation=cv2.INTER_AREA)
+        # センサーノイズによる誤検知を抑えるため軽くぼかす
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def should_decode(self, gray, force=False):
+        """
+        デコードが必要であればTrue、前回のデコードから変化がなければFalseを返す。
+        force=True の場合は変化の有無を判定したうえで、常にデコードする (Trueを返す)。
+        """
+        self.checked_count += 1
+        small = self._downscale(gray)
+        now = time.time()
+
+        if self._reference is None or self._reference.shape != small.shape:
+            self._reference = small
+            self._reference_time = now
+            self.last_motion = True
+            return True
+
+        diff = cv2.absdiff(small, self._reference)
+        changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+        self.last_changed_ratio = changed / diff.size
+        self.last_motion = self.last_changed_ratio >= self.changed_ratio_threshold
+
+        if (
+            force
+            or self.last_motion
+            or (self.max_skip_seconds > 0 and now - self._reference_time >= self.max_skip_seconds)
+        ):
+            self._reference = small
+            self._reference_time = now
+            return True
+
+        self.skipped_count += 1
+        return False
+
+    def get_stats(self):
+        """判定回数と省略したフレーム数を返す"""
+        return {
+            "motion_checked": self.checked_count,
+            "motion_skipped": self.skipped_count,
+            "motion_last_changed_ratio": round(self.last_changed_ratio, 4),
+        }
@@ -1,9 +1,16 @@
 # G_ScanBCD_Overlay.py
 import cv2
 import time
+from collections import OrderedDict, deque
+
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+from G_ScanBCD_Analyzer import get_barcode_types
+from G_ScanBCD_OverlayCanvas import (
+    OVERLAY_RENDERERS, GlyphCache, NumpyDraw, PilDraw, TextSpriteCache, blend_premultiplied,
+)
+
 class OverlayDisplay:
     # 要求される設定値のキー
     REQUIRED_KEYS = {
@@ -20,13 +27,29 @@ class OverlayDisplay:
 
     def __init__(self, config):
         self.config = config
-        self.scanned_info = []  # scanned_infoをインスタンス変数として保持
-        self.last_seen = {}  # バーコードの最終検出時間と位置を記録
+        # スキャン済みリスト (追加順 = 時刻順)。表示する display_lines 件だけを保持し、古いものは先頭から消える
+        self.scanned_info = deque(maxlen=max(1, int(self.config.get("display_lines") or 1)))
+        # バーコードの最終検出時間と位置を記録 (検出した順に並べ直し、先頭が最も古い)
+        self.last_seen = OrderedDict()
         self.detection_timeout = 1.0  # 検出が途切れてから矩形を消すまでの時間
         self.font = None # 日本語フォントを保持する変数
         self.font_large = None # 強調表示用の大きなフォント
         self.frame_count = 0 # デバッグ用フレームカウンタ
         self.last_debug_info = None # デバッグ情報の変更検知用
+        self._canvas = None # 描画用のPillow画像 (フレームごとに作り直さず使い回す)
+        self._spec_panel = None # 左上情報エリアの描画済みパッチ (表示内容が変わったときだけ作り直す)
+        self.latency = None # LatencyRecorder (呼び出し元が設定する。バッファの確保を記録する)
+
+        # 描画方式 ("pil": Pillowで画面全体を描画 / "numpy": OpenCVとNumPyでフレームに直接描画)
+        self.renderer = self.config.get("overlay_renderer", "pil")
+        if self.renderer not in OVERLAY_RENDERERS:
+            print(f"警告: 未対応の overlay_renderer '{self.renderer}' のため 'pil' を使用します。")
+            self.renderer = "pil"
+        self._glyph_cache = GlyphCache()
+        # 描画済みの文字列のキャッシュ (前のフレームと同じ文字列は描画し直さない)
+        self.text_sprites = TextSpriteCache(
+            self.renderer, self.config.get("overlay_text_cache_size", 256), self._glyph_cache
+        )
 
         missing_keys = []
         for key in self.REQUIRED_KEYS:
@@ -85,11 +108,40 @@ class OverlayDisplay:
         """
         use_font = font if font else self.font
         if use_font:
-            draw.text(position, text, font=use_font, fill=color, stroke_width=stroke_width, stroke_fill=color)
+            if hasattr(draw, "draw_sprite"):
+                # 描画済みの文字列をキャッシュから取り出して貼り付ける
+                draw.draw_sprite(self.text_sprites.get(text, use_font, color, stroke_width), position, color)
+            else:
+                draw.text(position, text, font=use_font, fill=color, stroke_width=stroke_width, stroke_fill=color)
         else:
             # フォントがない場合、描画をスキップ（またはOpenCVでの代替描画も可能だが、ここでは何もしない）
             print(f"警告: Pillowフォントが未設定のため、テキスト '{text}' は描画されません。")
 
+    def update(self, barcodes, now=None):
+        """
+        検出されたバーコードの位置と時刻を記録する。
+        画面を描画しないフレームでも毎フレーム呼び、次に描画するときに最新の検出結果を表示する。
+        """
+        now = time.time() if now is None else now
+        for barcode in barcodes:
+            barcode_info_str = barcode.data.decode('utf-8')
+            self.last_seen[barcode_info_str] = {'barcode': barcode, 'timestamp': now}
+            self.last_seen.move_to_end(barcode_info_str)
+
+    def _expire(self, now):
+        """
+        表示期限を過ぎたスキャン情報と、検出が途切れてから detection_timeout を過ぎたバーコードを削除する。
+        どちらも時刻順に並んでいるため、先頭から期限内の要素に当たるまで削除するだけでよい。
+        """
+        display_time = self.config.get("display_time")
+        scanned_info = self.scanned_info
+        while scanned_info and now - scanned_info[0]['timestamp'] > display_time:
+            scanned_info.popleft()
+
+        last_seen = self.last_seen
+        while last_seen and now - next(iter(last_seen.values()))['timestamp'] > self.detection_timeout:
+            last_seen.popitem(last=False)
+
     def display_overlay(
             self,
             frame,
@@ -102,106 +154,59 @@ class OverlayDisplay:
             construction_number,
             remaining_time,
             barcode_type,
-            expected_length):
+            expected_length,
+            hint=None):
 
         height = self.config.get("camera_height", 480)
         width = self.config.get("camera_width", 640)
         overlay_x = 30
         overlay_y = 30
 
-        # --- 描画処理の開始前に一度だけ画像形式を変換 ---
-        # OpenCV(BGR) -> Pillow(RGBA) へ変換。アルファチャンネルを扱うためRGBAにする。
-        img_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).convert("RGBA")
-        # ベースとなる描画用レイヤーを作成
-        draw = ImageDraw.Draw(img_pil)
-
-        text_mapping = self.config.get("display_text_mapping")
-        
-        # 呼び出し元で整形された文字列をそのまま使用する
-        spec_text = f"Type: {self.config.get('barcode_type')} | Digits: {self.config.get('expected_length')} | {context_label} | 工事番号: {construction_number}"
+        current_time = time.time()  # 時刻の取得はフレームごとに1回だけ行う
 
-        font_scale = self.config.get("font_scale")
-        display_lines = self.config.get("display_lines")
+        if not frame.flags.writeable or not frame.flags.c_contiguous:
+            frame = np.ascontiguousarray(frame).copy()
 
-        # テキストを改行で分割
-        spec_text_lines = spec_text.split(" | ")
-
-        # --- 左上情報エリアの背景サイズ計算 ---
-        line_heights = []
-        max_text_width = 0 # このブロックで使う最大幅
-        for line in spec_text_lines:
-            text_w, text_h = self._get_japanese_text_size(line)
-            max_text_width = max(max_text_width, text_w)
-            line_heights.append(text_h)
-
-        line_spacing = 10
-        total_text_height = sum(line_heights) + line_spacing * (len(line_heights) - 1)
-
-        # 背景の描画範囲を調整
-        padding_x = 10
-        padding_y = 10
-        background_left = overlay_x - padding_x
-        background_top = overlay_y - padding_y
-        background_right = int(overlay_x + max_text_width + padding_x)
-        background_bottom = int(overlay_y + total_text_height + padding_y)
-
-        # --- 半透明の背景とテキストを描画 ---
-        # 1. 半透明の背景用の別レイヤーを作成
-        alpha = self.config.get("overlay_alpha")
-        overlay_color = self.config.get("overlay_color")
-        alpha_int = int(alpha * 255)
-        overlay_img = Image.new('RGBA', img_pil.size, (255, 255, 255, 0)) # 全体が透明なレイヤー
-        draw_overlay = ImageDraw.Draw(overlay_img)
-
-        # 2. 背景レイヤーに半透明の四角形を描画
-        draw_overlay.rectangle(
-            (background_left, background_top, background_right, background_bottom),
-            fill=tuple(overlay_color) + (alpha_int,)
-        )
+        # 呼び出し元で整形された文字列をそのまま使用する
+        spec_text = f"Type: {'/'.join(get_barcode_types(self.config))} | Digits: {self.config.get('expected_length')} | {context_label} | 工事番号: {construction_number}"
 
-        # 3. テキストを背景レイヤーの上に描画
-        for i, line in enumerate(spec_text_lines):
-            current_y = overlay_y + sum(line_heights[:i]) + line_spacing * i
-            self._draw_text_with_pil(draw_overlay, line, (overlay_x, current_y), (255, 255, 255, 255), stroke_width=0)
+        # --- 左上情報エリア (半透明の背景とテキスト) を、描画済みのパッチからその範囲だけに合成 ---
+        # 表示内容はセッション中ほとんど変わらないため、変わったときだけパッチを作り直す
+        panel = self._get_spec_panel(spec_text, overlay_x, overlay_y)
+        self._blend_spec_panel(frame, panel)
 
-        # 4. ベース画像に背景とテキストが描画されたレイヤーを合成
-        img_pil = Image.alpha_composite(img_pil, overlay_img)
-        # 再度描画するためにDrawオブジェクトを再生成
-        draw = ImageDraw.Draw(img_pil)
+        if self.renderer == "numpy":
+            # フレームに直接描画する (文字は1文字ずつのマスクを文字列の範囲だけに合成する)
+            img_pil = None
+            draw = NumpyDraw(frame, self._glyph_cache)
+        else:
+            # 一度だけ、フレームの画素を使い回しているキャンバスに書き込む
+            # OpenCV(BGR) の並びのまま Pillow(RGB) に読み込むため、色変換用の配列は作らない
+            frame_size = (frame.shape[1], frame.shape[0])
+            if self._canvas is None or self._canvas.size != frame_size:
+                self._canvas = Image.new("RGB", frame_size)
+                self._record_allocation(frame.nbytes)
+            img_pil = self._canvas
+            img_pil.frombytes(frame, "raw", "BGR")
+            draw = PilDraw(img_pil)
+
+        # 現フレームで検出されたバーコードでlast_seenを更新し、期限切れの情報を削除する
+        self.update(barcodes, current_time)
+        self._expire(current_time)
 
         # --- スキャン済みリストの表示 (位置を修正) ---
         # 左上の情報表示エリアのすぐ下に表示する
-        scanned_list_y = background_bottom + 20
-        for info in self.scanned_info:  # インスタンス変数から参照
-            barcode_info = info['barcode']
-            barcode_type = info['type']
-            timestamp = info['timestamp']
-
-            if time.time() - timestamp <= self.config.get("display_time"):
-                text = f"Scanned: {barcode_info} ({barcode_type})"
-                self._draw_text_with_pil(draw, text, (overlay_x, scanned_list_y), (0, 255, 0), stroke_width=1)
-                scanned_list_y += 25 # 次の行へ
-
-        # 古いスキャン情報をリストから削除
-        self.scanned_info[:] = [info for info in self.scanned_info if time.time() - info['timestamp'] <= self.config.get("display_time")]
+        scanned_list_y = panel["bottom"] + 20
+        for info in self.scanned_info:  # 表示期限内の最新 display_lines 件
+            text = f"Scanned: {info['barcode']} ({info['type']})"
+            self._draw_text_with_pil(draw, text, (overlay_x, scanned_list_y), (0, 255, 0), stroke_width=1)
+            scanned_list_y += 25 # 次の行へ
 
         # --- バーコードの矩形と情報の描画 --- 
-        current_time = time.time()
-
-        # 現フレームで検出されたバーコードでlast_seenを更新
-        for barcode in barcodes:
-            barcode_info_str = barcode.data.decode('utf-8')
-            self.last_seen[barcode_info_str] = {'barcode': barcode, 'timestamp': current_time}
-
         # last_seenにあるバーコードを描画（色分けしつつ）
-        to_remove = []
         for barcode_info, seen_data in self.last_seen.items():
             elapsed_time = current_time - seen_data['timestamp']
 
-            if elapsed_time > self.detection_timeout:
-                to_remove.append(barcode_info)
-                continue
-
             # 時間経過で色を決定
             if elapsed_time < 0.2:
                 color = (0, 255, 0)  # 緑
@@ -220,7 +225,7 @@ class OverlayDisplay:
                 x, y, w, h = barcode_obj.rect
                 pts = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.int32).reshape((-1, 1, 2))
 
-            # Pillowで矩形を描画
+            # 矩形を描画
             draw.polygon([tuple(p) for p in pts.reshape(-1, 2)], outline=color, width=2)
 
             # テキストを描画
@@ -230,10 +235,7 @@ class OverlayDisplay:
             draw.rectangle((text_pos[0], text_pos[1], text_pos[0] + text_w, text_pos[1] + text_h + 5), fill=color)
             self._draw_text_with_pil(draw, text, (text_pos[0], text_pos[1] - 2), (0, 0, 0), stroke_width=0)
 
-        # タイムアウトしたバーコードを辞書から削除
-        for key in to_remove:
-            del self.last_seen[key]
-        
+
         # --- 画面右下にカウント情報を描画 --- (再有効化)
         # Pillowフォントを使用するため、OpenCVのフォント設定は不要
         line_height = 28 # 行間を少し広げる
@@ -256,8 +258,87 @@ class OverlayDisplay:
         for i, (text, color) in enumerate(count_texts_with_colors):
             self._draw_text_with_pil(draw, text, (start_x, start_y + i * line_height), color, stroke_width=0)
 
-        # --- すべての描画が完了したので、一度だけ画像形式を戻す ---
-        # RGBA -> BGR
-        frame = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGBA2BGR)
+        # --- 品質判定のヒント (「動かさずに保持してください」など) を画面下部中央に表示 ---
+        if hint:
+            hint_w, hint_h = self._get_japanese_text_size(hint)
+            hint_x = int((width - hint_w) / 2)
+            hint_y = height - hint_h - 30
+            draw.rectangle((hint_x - 10, hint_y - 5, hint_x + hint_w + 10, hint_y + hint_h + 10), fill=(0, 0, 0))
+            self._draw_text_with_pil(draw, hint, (hint_x, hint_y), (255, 165, 0), stroke_width=0)
+
+        if img_pil is None:
+            return frame
 
+        # --- すべての描画が完了したので、一度だけ BGR の並びでフレームに書き戻す ---
+        # (Pillow から取り出す際のバイト列だけは毎フレーム確保される)
+        rendered = np.frombuffer(img_pil.tobytes("raw", "BGR"), dtype=np.uint8).reshape(frame.shape)
+        self._record_allocation(rendered.nbytes)
+        np.copyto(frame, rendered)
         return frame
+
+    def _get_spec_panel(self, spec_text, overlay_x, overlay_y):
+        """
+        左上情報エリアを、乗算済みアルファのBGRAパッチとして描画する。
+        表示内容 (テキスト・色・不透明度・位置) が前回と同じ場合は、前回のパッチをそのまま返す。
+        """
+        alpha = self.config.get("overlay_alpha")
+        overlay_color = tuple(self.config.get("overlay_color"))
+        key = (spec_text, overlay_color, alpha, overlay_x, overlay_y, id(self.font))
+        if self._spec_panel is not None and self._spec_panel["key"] == key:
+            return self._spec_panel
+
+        # テキストを改行で分割
+        spec_text_lines = spec_text.split(" | ")
+
+        # --- 背景サイズ計算 ---
+        line_heights = []
+        max_text_width = 0 # このブロックで使う最大幅
+        for line in spec_text_lines:
+            text_w, text_h = self._get_japanese_text_size(line)
+            max_text_width = max(max_text_width, text_w)
+            line_heights.append(text_h)
+
+        line_spacing = 10
+        total_text_height = sum(line_heights) + line_spacing * (len(line_heights) - 1)
+
+        # 背景の描画範囲を調整
+        padding_x = 10
+        padding_y = 10
+        background_left = overlay_x - padding_x
+        background_top = overlay_y - padding_y
+        background_right = int(overlay_x + max_text_width + padding_x)
+        background_bottom = int(overlay_y + total_text_height + padding_y)
+        panel_size = (background_right - background_left, background_bottom - background_top)
+
+        # 1. 半透明の背景と、その上のテキストをパッチ (RGBA) に描画する
+        patch = Image.new("RGBA", panel_size, overlay_color + (int(alpha * 255),))
+        draw_patch = ImageDraw.Draw(patch)
+        for i, line in enumerate(spec_text_lines):
+            current_y = overlay_y + sum(line_heights[:i]) + line_spacing * i
+            position = (overlay_x - background_left, current_y - background_top)
+            self._draw_text_with_pil(draw_patch, line, position, (255, 255, 255, 255), stroke_width=0)
+
+        # 2. BGR の並びで、色をアルファで乗算しておく (合成時は 背景 * (255 - a) + 色 * a を 255 で割るだけになる)
+        rgba = np.asarray(patch, dtype=np.uint16)
+        alpha_channel = rgba[:, :, 3:4]
+        self._spec_panel = {
+            "key": key,
+            "left": background_left,
+            "top": background_top,
+            "bottom": background_bottom,
+            "premultiplied": np.ascontiguousarray(rgba[:, :, 2::-1] * alpha_channel + 127),
+            "inverse_alpha": 255 - alpha_channel,
+        }
+        return self._spec_panel
+
+    def _blend_spec_panel(self, frame, panel):
+        """描画済みのパッチを、フレームのその範囲だけに合成する"""
+        blend_premultiplied(frame, panel["premultiplied"], panel["inverse_alpha"], panel["left"], panel["top"])
+
+    def get_stats(self):
+        """描画済み文字列のキャッシュの統計を返す"""
+        return self.text_sprites.get_stats()
+
+    def _record_allocation(self, nbytes):
+        if self.latency is not None:
+            self.latency.record_allocation("overlay", nbytes)
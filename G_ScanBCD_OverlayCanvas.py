@@ -0,0 +1,233 @@
+# G_ScanBCD_OverlayCanvas.py
+# オーバーレイの描画に使う部品 (Pillow を使わずに BGR のフレームへ直接描画する NumpyDraw と、
+# 両方の描画方式で共通に使う、描画済み文字列のキャッシュ)
+
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+# 使用できる描画方式
+OVERLAY_RENDERERS = ("pil", "numpy")
+
+# 描画済みの文字列。left, top: 描画位置からのずれ
+# mask: "pil" では Pillow の濃淡画像、"numpy" では濃淡マスクの配列 (描画する画素がなければ None)
+# premultiplied, inverse_alpha: "numpy" で合成に使う、色をアルファで乗算した値と 255 - アルファ
+TextSprite = namedtuple("TextSprite", "left top mask premultiplied inverse_alpha")
+
+
+def blend_mask(frame, mask, x, y, color):
+    """
+    濃淡マスク (0-255) を不透明度として、color (BGR) をフレームの (x, y) からの範囲だけに合成する。
+    フレームからはみ出す部分は切り捨てる。
+    """
+    mask_h, mask_w = mask.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(frame.shape[1], x + mask_w), min(frame.shape[0], y + mask_h)
+    if x1 <= x0 or y1 <= y0:
+        return
+    alpha = mask[y0 - y:y1 - y, x0 - x:x1 - x, None].astype(np.uint16)
+    roi = frame[y0:y1, x0:x1]
+    roi[...] = (roi * (255 - alpha) + np.array(color, dtype=np.uint16) * alpha + 127) // 255
+
+
+def blend_premultiplied(frame, premultiplied, inverse_alpha, x, y):
+    """
+    乗算済みアルファのパッチ (色 * a + 127 と 255 - a) を、フレームの (x, y) からの範囲だけに合成する。
+    フレームからはみ出す部分は切り捨てる。
+    """
+    patch_h, patch_w = premultiplied.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(frame.shape[1], x + patch_w), min(frame.shape[0], y + patch_h)
+    if x1 <= x0 or y1 <= y0:
+        return
+    rows, cols = slice(y0 - y, y1 - y), slice(x0 - x, x1 - x)
+    roi = frame[y0:y1, x0:x1]
+    roi[...] = (roi * inverse_alpha[rows, cols] + premultiplied[rows, cols]) // 255
+
+
+class GlyphCache:
+    """
+    1文字ずつの濃淡マスクを (文字, フォント, 縁取りの太さ) ごとに保持する。
+    表示される文字の種類 (数字・英字・画面で使う漢字) は限られているため、上限は設けない。
+    """
+
+    def __init__(self):
+        self._glyphs = {}
+
+    def get(self, char, font, stroke_width=0):
+        """(マスク (なければ None), 描画位置からのずれ x, y, 送り幅) を返す"""
+        key = (char, id(font), stroke_width)
+        glyph = self._glyphs.get(key)
+        if glyph is None:
+            glyph = self._glyphs[key] = self._render(char, font, stroke_width)
+        return glyph
+
+    @staticmethod
+    def _render(char, font, stroke_width):
+        left, top, right, bottom = font.getbbox(char, stroke_width=stroke_width)
+        advance = font.getlength(char)
+        if right <= left or bottom <= top:
+            return None, 0, 0, advance  # 空白など、描画する画素のない文字
+        image = Image.new("L", (right - left, bottom - top), 0)
+        ImageDraw.Draw(image).text(
+            (-left, -top), char, font=font, fill=255, stroke_width=stroke_width, stroke_fill=255
+        )
+        return np.asarray(image), left, top, advance
+
+    def __len__(self):
+        return len(self._glyphs)
+
+
+def compose_text_mask(text, font, glyph_cache, stroke_width=0):
+    """
+    文字ごとのマスクを並べて、文字列全体の濃淡マスクを作成する。
+    戻り値: (マスク (描画する画素がなければ None), 描画位置からのずれ x, y)
+    """
+    placed = []
+    pen_x = 0.0
+    for char in text:
+        mask, dx, dy, advance = glyph_cache.get(char, font, stroke_width)
+        if mask is not None:
+            placed.append((mask, int(round(pen_x)) + dx, dy))
+        pen_x += advance
+    if not placed:
+        return None, 0, 0
+
+    left = min(x for _, x, _ in placed)
+    top = min(y for _, _, y in placed)
+    right = max(x + mask.shape[1] for mask, x, _ in placed)
+    bottom = max(y + mask.shape[0] for mask, _, y in placed)
+    text_mask = np.zeros((bottom - top, right - left), dtype=np.uint8)
+    for mask, x, y in placed:
+        region = text_mask[y - top:y - top + mask.shape[0], x - left:x - left + mask.shape[1]]
+        np.maximum(region, mask, out=region)  # 隣の文字と重なる部分は濃い方を残す
+    return text_mask, left, top
+
+
+class TextSpriteCache:
+    """
+    描画済みの文字列 (TextSprite) を (文字列, フォント, 色, 縁取りの太さ) ごとに保持する LRU キャッシュ。
+    カウント表示やスキャン済みリストのように前のフレームと同じ文字列は、描画し直さずに貼り付けるだけになる。
+    max_entries を超えた場合は、最も長く使われていない文字列から削除する。
+    """
+
+    def __init__(self, renderer="pil", max_entries=256, glyph_cache=None):
+        self.renderer = renderer
+        self.max_entries = max(1, int(max_entries))
+        self.glyph_cache = glyph_cache if glyph_cache is not None else GlyphCache()
+        self._sprites = OrderedDict()
+
+        # 統計情報
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text, font, color, stroke_width=0):
+        """文字列の TextSprite を返す (キャッシュになければ描画して追加する)"""
+        key = (text, id(font), tuple(color), stroke_width)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        self.misses += 1
+        sprite = self._sprites[key] = self._render(text, font, color, stroke_width)
+        if len(self._sprites) > self.max_entries:
+            self._sprites.popitem(last=False)
+            self.evictions += 1
+        return sprite
+
+    def _render(self, text, font, color, stroke_width):
+        if self.renderer == "numpy":
+            # 1文字ずつのマスクを並べ、色をアルファで乗算しておく
+            mask, left, top = compose_text_mask(text, font, self.glyph_cache, stroke_width)
+            if mask is None:
+                return TextSprite(0, 0, None, None, None)
+            alpha = mask[:, :, None].astype(np.uint16)
+            premultiplied = np.array(color[2::-1], dtype=np.uint16) * alpha + 127
+            return TextSprite(left, top, mask, premultiplied, 255 - alpha)
+
+        # Pillow の draw.text と同じ描画結果になるよう、文字列全体を濃淡画像に描画する
+        left, top, right, bottom = font.getbbox(text, stroke_width=stroke_width)
+        if right <= left or bottom <= top:
+            return TextSprite(0, 0, None, None, None)
+        mask = Image.new("L", (right - left, bottom - top), 0)
+        ImageDraw.Draw(mask).text(
+            (-left, -top), text, font=font, fill=255, stroke_width=stroke_width, stroke_fill=255
+        )
+        return TextSprite(left, top, mask, None, None)
+
+    def get_stats(self):
+        """キャッシュの件数とヒット率を返す"""
+        lookups = self.hits + self.misses
+        return {
+            "text_cache_size": len(self._sprites),
+            "text_cache_hits": self.hits,
+            "text_cache_misses": self.misses,
+            "text_cache_evictions": self.evictions,
+            "text_cache_hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class PilDraw(ImageDraw.ImageDraw):
+    """PIL.ImageDraw に、描画済みの文字列 (TextSprite) を貼り付ける draw_sprite を加えたもの"""
+
+    def __init__(self, image):
+        super().__init__(image)
+        self._target = image
+
+    def draw_sprite(self, sprite, position, color):
+        if sprite.mask is None:
+            return
+        x, y = position
+        self._target.paste(tuple(color), (int(round(x)) + sprite.left, int(round(y)) + sprite.top), sprite.mask)
+
+
+class NumpyDraw:
+    """
+    OverlayDisplay が使う PIL.ImageDraw の機能 (text / polygon / rectangle) を、
+    BGR のフレームへ直接描画する形で提供する。色は ImageDraw と同じく RGB で受け取る。
+    図形は OpenCV で描画し、文字は GlyphCache のマスクを文字列の範囲だけに合成する。
+    """
+
+    def __init__(self, frame, glyph_cache):
+        self.frame = frame
+        self.glyph_cache = glyph_cache
+
+    @staticmethod
+    def _bgr(color):
+        return tuple(int(c) for c in color[2::-1])
+
+    def draw_sprite(self, sprite, position, color):
+        if sprite.mask is None:
+            return
+        x, y = position
+        blend_premultiplied(
+            self.frame, sprite.premultiplied, sprite.inverse_alpha, int(round(x)) + sprite.left, int(round(y)) + sprite.top
+        )
+
+    def text(self, position, text, font=None, fill=(255, 255, 255), stroke_width=0, stroke_fill=None):
+        if font is None:
+            return
+        mask, dx, dy = compose_text_mask(text, font, self.glyph_cache, stroke_width)
+        if mask is None:
+            return
+        x, y = position
+        blend_mask(self.frame, mask, int(round(x)) + dx, int(round(y)) + dy, self._bgr(fill))
+
+    def polygon(self, points, outline=None, width=1, fill=None):
+        pts = np.array(points, dtype=np.int32).reshape((-1, 1, 2))
+        if fill is not None:
+            cv2.fillPoly(self.frame, [pts], self._bgr(fill))
+        if outline is not None:
+            cv2.polylines(self.frame, [pts], isClosed=True, color=self._bgr(outline), thickness=width)
+
+    def rectangle(self, box, fill=None, outline=None, width=1):
+        x0, y0, x1, y1 = (int(round(v)) for v in box)
+        if fill is not None:
+            cv2.rectangle(self.frame, (x0, y0), (x1, y1), self._bgr(fill), thickness=-1)
+        if outline is not None:
+            cv2.rectangle(self.frame, (x0, y0), (x1, y1), self._bgr(outline), thickness=width)
@@ -0,0 +1,201 @@
+# G_ScanBCD_Pacing.py
+# スキャンループのフレームレートを制御するクラス
+# (動きやバーコードがない間は低いフレームレートに落とし、部品が提示されたら target_fps に戻す)
+# と、画面表示をデコードとは別のフレームレートで更新するための時計
+
+import time
+
+
+class PacingGovernor:
+    """
+    フレームの開始予定時刻 (デッドライン) を周期ずつ進めて待ち時間を決める。
+    処理時間に関係なく開始時刻の間隔が一定になり、処理が遅れた場合は追いつこうとせずに数え直す。
+    フレームの処理時間は指数移動平均で測定し、処理が target_fps に追いつかない場合は、
+    処理時間に headroom の余裕を持たせた持続可能なフレームレート (sustainable_fps) に落ち着かせる。
+    idle_fps > 0 の場合、idle_after 秒間動きもバーコードもなければ idle_fps に落とし、
+    動きかバーコードを検知したフレームで target_fps に戻す。
+    """
+
+    def __init__(self, target_fps=30, idle_fps=0, idle_after=2.0, smoothing=0.2, headroom=0.9):
+        self.target_fps = target_fps or 0
+        self.idle_fps = min(idle_fps or 0, self.target_fps) if self.target_fps else 0
+        self.idle_after = idle_after
+        self.smoothing = min(1.0, max(0.01, smoothing))  # 指数移動平均の重み
+        self.headroom = min(1.0, max(0.1, headroom))  # 1周期のうちフレームの処理に使ってよい割合
+
+        self.idle = False
+        self._deadline = None  # 次のフレームの開始予定時刻 (perf_counter)
+        self._frame_start = None
+        self._waited = 0.0  # 処理中のフレームで、カメラからのフレームを待っていた時間
+        self._last_activity = time.perf_counter()
+
+        # 統計情報
+        self.frame_count = 0
+        self.idle_frame_count = 0
+        self.mode_changes = 0
+        self.frame_cost = 0.0  # フレームの処理時間 (秒、フレームの到着待ちを除く) の指数移動平均
+        self.frame_interval = 0.0  # フレームの開始間隔 (秒) の指数移動平均
+        self._first_start = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            target_fps=config.get("target_fps", 30),
+            idle_fps=config.get("pacing_idle_fps", 5),
+            idle_after=config.get("pacing_idle_after_seconds", 2.0),
+            smoothing=config.get("pacing_smoothing", 0.2),
+            headroom=config.get("pacing_headroom", 0.9),
+        )
+
+    @property
+    def sustainable_fps(self):
+        """測定した処理時間で持続できるフレームレート (まだ測定していない場合は 0)"""
+        return self.headroom / self.frame_cost if self.frame_cost > 0 else 0.0
+
+    @property
+    def current_fps(self):
+        """現在の目標フレームレート (0 の場合は制限なし)。処理が追いつかない場合は sustainable_fps に落とす"""
+        fps = self.idle_fps if self.idle else self.target_fps
+        sustainable = self.sustainable_fps
+        if fps and sustainable and sustainable < fps:
+            return sustainable
+        return fps
+
+    @property
+    def period(self):
+        fps = self.current_fps
+        return 1 / fps if fps else 0.0
+
+    def _ema(self, average, value):
+        return value if average == 0.0 else average + self.smoothing * (value - average)
+
+    def time_until_next_frame(self, now=None):
+        """次のフレームの開始予定時刻までの秒数"""
+        if self._deadline is None or not self.current_fps:
+            return 0.0
+        now = time.perf_counter() if now is None else now
+        return max(0.0, self._deadline - now)
+
+    def frame_started(self, now=None):
+        """フレームの処理を開始したことを記録し、次のフレームの開始予定時刻を決める"""
+        now = time.perf_counter() if now is None else now
+        if self._frame_start is not None:
+            self.frame_interval = self._ema(self.frame_interval, now - self._frame_start)
+        else:
+            self._first_start = now
+        self._frame_start = now
+        self._waited = 0.0
+        self.frame_count += 1
+        if self.idle:
+            self.idle_frame_count += 1
+
+        # 1周期以上遅れている場合は、遅れを取り戻そうとせず現在時刻から数え直す
+        if self._deadline is None or now - self._deadline > self.period:
+            self._deadline = now
+        self._deadline += self.period
+
+    def frame_waited(self, seconds):
+        """フレームの処理中に、カメラからのフレームの到着を待っていた時間を記録する (処理時間から除く)"""
+        self._waited += seconds
+
+    def frame_finished(self, now=None):
+        """フレームの処理 (取得・デコード・描画) が終わったことを記録する"""
+        if self._frame_start is None:
+            return
+        now = time.perf_counter() if now is None else now
+        self.frame_cost = self._ema(self.frame_cost, max(0.0, now - self._frame_start - self._waited))
+        self._waited = 0.0
+
+    def observe(self, active, now=None):
+        """
+        フレームで動きかバーコードを検知したか (active) を記録し、待機モードを切り替える。
+        待機モードから戻るときは、次のフレームをすぐに処理する。
+        """
+        if not self.idle_fps:
+            return
+        now = time.perf_counter() if now is None else now
+        if active:
+            self._last_activity = now
+            if self.idle:
+                self.idle = False
+                self.mode_changes += 1
+                self._deadline = now
+        elif not self.idle and now - self._last_activity >= self.idle_after:
+            self.idle = True
+            self.mode_changes += 1
+
+    def get_stats(self):
+        """目標FPSと実測FPS、フレームの処理時間、持続可能なFPS、待機モードの割合を返す"""
+        elapsed = (self._frame_start or 0.0) - (self._first_start or 0.0)
+        return {
+            "target_fps": self.target_fps,
+            "idle_fps": self.idle_fps,
+            "achieved_fps": round((self.frame_count - 1) / elapsed, 1) if elapsed > 0 else 0.0,
+            "recent_fps": round(1 / self.frame_interval, 1) if self.frame_interval > 0 else 0.0,
+            "frame_cost_ms": round(self.frame_cost * 1000, 2),
+            "sustainable_fps": round(self.sustainable_fps, 1),
+            "paced_fps": round(self.current_fps, 1),
+            "idle_frame_ratio": round(self.idle_frame_count / self.frame_count, 3) if self.frame_count else 0.0,
+            "mode_changes": self.mode_changes,
+        }
+
+
+class DisplayClock:
+    """
+    画面表示 (オーバーレイの描画・imshow) を preview_fps の周期で更新するための時計。
+    デコードは毎フレーム行い、表示は周期が切り替わったときだけ最新の状態で描画し直す。
+    複数の表示先 (カメラごとのウィンドウ) で共有し、
+    それぞれが1周期に1回だけ更新されるよう、表示先ごとに最後に更新した周期を記録する。
+    """
+
+    def __init__(self, fps=15):
+        self.fps = fps or 0
+        self.tick_count = 0  # 切り替わった周期の数
+        self._deadline = None  # 次の周期の開始予定時刻 (perf_counter)
+        self._updated = {}  # 表示先ごとの、最後に更新した周期の番号
+
+        # 統計情報
+        self.update_count = 0
+        self.skip_count = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(fps=config.get("preview_fps", 15))
+
+    @property
+    def period(self):
+        return 1 / self.fps if self.fps else 0.0
+
+    def tick(self, now=None):
+        """現在の周期の番号を返す (preview_fps が 0 の場合は呼ぶたびに切り替わる)"""
+        if not self.fps:
+            self.tick_count += 1
+            return self.tick_count
+        now = time.perf_counter() if now is None else now
+        if self._deadline is None or now >= self._deadline:
+            # 1周期以上遅れている場合は、遅れを取り戻そうとせず現在時刻から数え直す
+            if self._deadline is None or now - self._deadline > self.period:
+                self._deadline = now
+            self._deadline += self.period
+            self.tick_count += 1
+        return self.tick_count
+
+    def due(self, target, now=None):
+        """表示先 target を更新すべきであれば True (この周期でまだ更新していない)"""
+        tick = self.tick(now)
+        if self._updated.get(target) == tick:
+            self.skip_count += 1
+            return False
+        self._updated[target] = tick
+        self.update_count += 1
+        return True
+
+    def get_stats(self):
+        """表示の更新回数と、更新を省略した回数を返す"""
+        checks = self.update_count + self.skip_count
+        return {
+            "preview_fps": self.fps,
+            "display_updates": self.update_count,
+            "display_skips": self.skip_count,
+            "display_update_ratio": round(self.update_count / checks, 3) if checks else 0.0,
+        }
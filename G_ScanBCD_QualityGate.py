@@ -0,0 +1,116 @@
+# G_ScanBCD_QualityGate.py
+# ピンぼけ・手ぶれ・露出不足でデコードできる見込みのないフレームを判定するクラス
+# (barcode_readability_tester.py と同じく、画面全体を同じ幅に縮小した画像でラプラシアン分散と平均輝度を計算する)
+
+import cv2
+
+# 表示するヒント
+HINT_HOLD_STILL = "動かさずに保持してください"
+HINT_MOVE_CLOSER = "ラベルをカメラに近づけてください"
+HINT_TOO_DARK = "暗すぎます"
+HINT_TOO_BRIGHT = "明るすぎます"
+
+# 読み取りテストツールと共通の閾値
+DEFAULT_FOCUS_THRESHOLD = 115.0  # readability_tester_settings に focus_threshold がない場合
+BRIGHTNESS_TOO_DARK_THRESHOLD = 70
+BRIGHTNESS_TOO_BRIGHT_THRESHOLD = 180
+
+# ぼやけ・明るさを測定する縮小画像の幅 (ラプラシアン分散は解像度で変わるため、テストツールと必ず同じ幅で測る)
+DEFAULT_MEASURE_WIDTH = 320
+
+
+def downscale_for_measure(gray, width=DEFAULT_MEASURE_WIDTH):
+    """画面全体を幅 width に縮小する (width 以下の画像はそのまま返す)"""
+    height, frame_width = gray.shape[:2]
+    if frame_width <= width:
+        return gray
+    small_height = max(1, int(height * width / frame_width))
+    return cv2.resize(gray, (width, small_height), interpolation=cv2.INTER_AREA)
+
+
+def measure_focus(small):
+    """ぼやけ具合 (ラプラシアン分散) を返す。値が小さいほどぼやけている"""
+    return float(cv2.Laplacian(small, cv2.CV_32F).var())
+
+
+def measure_brightness(small):
+    """平均輝度を返す"""
+    return float(cv2.mean(small)[0])
+
+
+class QualityGate:
+    """
+    画面全体を quality_measure_width の幅に縮小した画像でぼやけ具合と明るさを求め、
+    明らかに読めないフレームではデコードを省略してよいと判定する。
+    読み取りテストツールも同じ幅に縮小して測定するため、テストツールで調整した
+    readability_tester_settings の focus_threshold をそのまま使える。明るさの閾値もテストツールと同じ値を既定値とする。
+    """
+
+    def __init__(self, config):
+        self.config = config
+        tester_settings = self.config.get("readability_tester_settings", {}) or {}
+        self.focus_threshold = tester_settings.get("focus_threshold", DEFAULT_FOCUS_THRESHOLD)
+        self.min_brightness = self.config.get("quality_min_brightness", BRIGHTNESS_TOO_DARK_THRESHOLD)
+        self.max_brightness = self.config.get("quality_max_brightness", BRIGHTNESS_TOO_BRIGHT_THRESHOLD)
+        self.measure_width = max(32, int(self.config.get("quality_measure_width", DEFAULT_MEASURE_WIDTH)))
+        # 前のフレームとの平均差分がこの値以上なら、ぼやけの原因を手ぶれとみなす
+        self.motion_threshold = self.config.get("quality_motion_threshold", 8.0)
+
+        self._previous = None  # 前のフレームの縮小画像 (手ぶれの判定用。フレームのバッファとは切り離して保持する)
+
+        # 統計情報
+        self.checked_count = 0
+        self.skipped_blur = 0
+        self.skipped_dark = 0
+        self.skipped_bright = 0
+        self.last_focus = 0.0
+        self.last_brightness = 0.0
+        self.hint = None  # オーバーレイに表示するヒント (デコードした場合は None)
+
+    def should_decode(self, gray):
+        """デコードする価値があればTrue、明らかに読めないフレームであればFalseを返す"""
+        self.checked_count += 1
+        small = downscale_for_measure(gray, self.measure_width)
+        if small is gray:
+            small = gray.copy()
+        previous, self._previous = self._previous, small
+
+        self.last_focus = measure_focus(small)
+        self.last_brightness = measure_brightness(small)
+
+        if self.last_brightness < self.min_brightness:
+            self.skipped_dark += 1
+            self.hint = HINT_TOO_DARK
+            return False
+        if self.last_brightness > self.max_brightness:
+            self.skipped_bright += 1
+            self.hint = HINT_TOO_BRIGHT
+            return False
+        if self.last_focus < self.focus_threshold:
+            self.skipped_blur += 1
+            self.hint = self._blur_hint(small, previous)
+            return False
+
+        self.hint = None
+        return True
+
+    def _blur_hint(self, small, previous):
+        """ぼやけている原因に応じたヒントを返す"""
+        if previous is not None and previous.shape == small.shape:
+            if float(cv2.mean(cv2.absdiff(small, previous))[0]) >= self.motion_threshold:
+                return HINT_HOLD_STILL
+        # 何も写っていない (模様がほとんどない) 場合はヒントを出さない
+        if self.last_focus < self.focus_threshold * 0.1:
+            return None
+        return HINT_MOVE_CLOSER
+
+    def get_stats(self):
+        """判定回数と、原因ごとに省略したフレーム数を返す"""
+        return {
+            "quality_checked": self.checked_count,
+            "quality_skipped_blur": self.skipped_blur,
+            "quality_skipped_dark": self.skipped_dark,
+            "quality_skipped_bright": self.skipped_bright,
+            "quality_last_focus": round(self.last_focus, 1),
+            "quality_last_brightness": round(self.last_brightness, 1),
+        }
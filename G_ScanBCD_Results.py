@@ -5,7 +5,7 @@ class ResultDisplay:
 	def __init__(self):
 		pass
 
-	def show_results(self, scan_count, context_value, construction_number, supplier, context_label="項目", font_size=14, verification_result=None, success_count=0, duplicate_count=0, failure_count=0):
+	def show_results(self, scan_count, context_value, construction_number, supplier, context_label="項目", font_size=14, verification_result=None, success_count=0, duplicate_count=0, failure_count=0, camera_stats=None, latency_summary=None):
 		"""Displays the scan results in a dialog."""
 		# ダイアログウィンドウを作成
 		root = tk.Tk()
@@ -56,6 +56,23 @@ class ResultDisplay:
 			tk.Label(main_frame, text=f"{failure_count} 件", font=value_font, fg="red").grid(row=row_index, column=1, sticky="w", padx=10, pady=2)
 			row_index += 1
 
+		# --- カメラ別の内訳 (複数カメラ使用時) ---
+		if camera_stats and len(camera_stats) > 1:
+			for camera, stats in camera_stats.items():
+				tk.Label(main_frame, text=f"  (カメラ {camera}):", font=label_font).grid(row=row_index, column=0, sticky="w", pady=2, padx=(20, 0))
+				tk.Label(main_frame, text=f"成功 {stats['success']} / 重複 {stats['duplicate']} / 失敗 {stats['failure']} 件", font=value_font).grid(row=row_index, column=1, sticky="w", padx=10, pady=2)
+				row_index += 1
+
+		# --- 処理時間 (処理段階ごとの p50 / p95 / p99) ---
+		if latency_summary:
+			tk.Label(main_frame, text="処理時間 (ms):", font=label_font).grid(row=row_index, column=0, sticky="w", pady=(8, 2))
+			row_index += 1
+			small_font = ("Helvetica", max(9, font_size - 4))
+			for stage, stats in latency_summary.items():
+				tk.Label(main_frame, text=f"  {stage}:", font=small_font).grid(row=row_index, column=0, sticky="w", padx=(20, 0))
+				tk.Label(main_frame, text=f"p50 {stats['p50_ms']} / p95 {stats['p95_ms']} / p99 {stats['p99_ms']}", font=small_font).grid(row=row_index, column=1, sticky="w", padx=10)
+				row_index += 1
+
 		# --- 照合結果の表示 ---
 		if verification_result and verification_result.get("source_loaded"):
 			match = verification_result["match_count"]
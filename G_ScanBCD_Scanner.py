@@ -6,7 +6,6 @@ import cv2
 import time
 import os
 import json
-from datetime import datetime
 import logging
 from logging.handlers import RotatingFileHandler
 import numpy as np
@@ -20,6 +19,9 @@ from G_ScanBCD_DataCollector import G_ScanBCD_DataCollector
 from G_ScanBCD_CsvWriter import G_ScanBCD_CsvWriter
 from G_ManualEntryDialog import ManualEntryDialog  # 新しいダイアログをインポート
 from G_ScanBCD_Overlay import OverlayDisplay
+from G_ScanBCD_FrameSource import open_frame_source, is_live_source
+from G_ScanBCD_Engine import ScanEngine, ScanEvent, CsvSink, get_current_timestamp
+from G_ScanBCD_Control import CommandListener
 
 # ターミナル出力時文字化け対策
 sys.stdout.reconfigure(encoding="utf-8")
@@ -39,8 +41,27 @@ class BarcodeScanner:
         "idle_timeout",
     }
 
-    def __init__(self, config, location, construction_number, supplier=None):
+    # キー入力と操作コマンドの対応
+    KEY_COMMANDS = {
+        ord("q"): "stop",
+        27: "stop",  # ESCキー
+        ord("n"): "no_barcode",
+        ord("m"): "manual",
+    }
+
+    def __init__(self, config, location, construction_number, supplier=None, frame_source=None, headless=None,
+                 camera_indices=None):
         self.config = config
+        # 使用するカメラ番号のリスト (Noneの場合は config の camera_index。リストで複数台を指定可能)
+        if camera_indices is None:
+            camera_indices = self.config.get("camera_index", 0)
+        if not isinstance(camera_indices, (list, tuple)):
+            camera_indices = [camera_indices]
+        self.camera_indices = list(camera_indices)
+        # 画面表示なしで動作するか (Noneの場合は config の headless に従う)
+        self.headless = self.config.get("headless", False) if headless is None else headless
+        # カメラの代わりに再生する動画ファイルまたは画像フォルダ (Noneならカメラ)
+        self.frame_source = frame_source
 
         missing_keys = []
         for key in self.REQUIRED_KEYS:
@@ -55,8 +76,6 @@ class BarcodeScanner:
         self.scan_log = self.config.get("scan_log")
         self.expected_length = self.config.get("expected_length")
         self.barcode_type = self.config.get("barcode_type")
-        self.barcode_data = self.config.get("barcode_data")
-        self.scan_count = self.config.get("scan_count")
         self.display_time = self.config.get("display_time")
         self.target_fps = self.config.get("target_fps")
         self.auto_stop = self.config.get("auto_stop")
@@ -76,14 +95,9 @@ class BarcodeScanner:
 
         self.location = location
         self.construction_number = construction_number
-        self.last_scan_time = time.time()
         self.worker_name = self.config.get("current_worker", "unknown")
 
         self._tk_dialog_parent_window = None  # Tkinterダイアログの親ウィンドウ用
-        self.success_count = 0  # 成功したスキャン数
-        self.failure_count = 0  # 失敗したスキャン数
-        self.duplicate_count = 0  # 重複したスキャン数
-        self.last_frame_time = 0
 
         # ログ設定
         self._setup_logging()
@@ -93,6 +107,15 @@ class BarcodeScanner:
         self.data_collector = G_ScanBCD_DataCollector()
         self.csv_writer = G_ScanBCD_CsvWriter(config)
 
+        # 取得・デコード・検証・重複チェックは ScanEngine が行う (全カメラで重複チェックとCSVを共有)
+        self.engine = ScanEngine(
+            config,
+            analyzer=self.analyzer,
+            sinks=[CsvSink(self.csv_writer, self.location, self.construction_number, self.worker_name)],
+            on_valid_scan=self._on_valid_scan,
+            on_idle_timeout=self._on_idle_timeout,
+        )
+
         # オーバーレイの初期化
         self.overlay_display = OverlayDisplay(
             config
@@ -180,24 +203,21 @@ class BarcodeScanner:
         barcode_info = self._generate_no_barcode_id()
         barcode_type = self.no_barcode_type
 
-        if barcode_info not in self.barcode_data:
-            self.barcode_data.append(barcode_info)
-            self.scan_count += 1
-            self.success_count += 1
+        # 重複チェック・カウント・CSVへの書き込みはエンジンで行う (アイドルタイムもリセットされる)
+        event = ScanEvent(barcode_info, barcode_type, self.get_current_timestamp(), "manual", None)
+        if self.engine.record(event, notify=False):
             data = self.data_collector.collect(
                 barcode_info,
                 barcode_type,
-                self.get_current_timestamp(),
+                event.timestamp,
                 self.location,
                 self.construction_number,
                 self.worker_name,
             )
             self.logger.info("手動登録: %s", data)
             print(f"Manually Registered: {barcode_info} Type: {barcode_type}")
-            self.csv_writer.write(data)
 
             self.add_scanned_info(barcode_info, barcode_type)
-            self.last_scan_time = time.time()  # アイドルタイムリセット
         else:
             # 通常は発生しないはずだが、ID生成ロジックに問題があった場合など
             print(f"⚠ 生成された代替ID {barcode_info} は既に存在します。")
@@ -228,14 +248,13 @@ class BarcodeScanner:
             # ダイアログの結果からbarcode_typeを使用
             barcode_type = selected_part_info["barcode_type"]
 
-            if barcode_info not in self.barcode_data:
-                self.barcode_data.append(barcode_info)
-                self.scan_count += 1  # スキャン数としてカウント（手動登録も1件として）
-                self.success_count += 1
+            # スキャン数としてカウント（手動登録も1件として）
+            event = ScanEvent(barcode_info, barcode_type, self.get_current_timestamp(), "manual", None)
+            if self.engine.record(event, notify=False):
                 data = self.data_collector.collect(
                     barcode_info,
                     barcode_type,
-                    self.get_current_timestamp(),
+                    event.timestamp,
                     self.location,
                     self.construction_number,
                     self.worker_name,
@@ -246,10 +265,8 @@ class BarcodeScanner:
                 print(
                     f"Manually Registered (Drawing): {barcode_info} Type: {barcode_type}"
                 )
-                self.csv_writer.write(data)
 
                 self.add_scanned_info(barcode_info, barcode_type)
-                self.last_scan_time = time.time()  # アイドルタイムリセット
             else:
                 print(
                     f"⚠ {barcode_type} で登録しようとした発注伝票番号 {barcode_info} は既にスキャン/登録済みです。"
@@ -257,117 +274,191 @@ class BarcodeScanner:
         else:
             print("図番による手動登録はキャンセルされました。")
 
-    def start(self):
-        cap = cv2.VideoCapture(self.config.get("camera_index", 0))
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.config.get("camera_width", 640))
+    # スキャン状態は ScanEngine が保持する (結果表示やカウント表示ウィンドウから参照される)
+    @property
+    def scan_count(self):
+        return self.engine.scan_count
+
+    @property
+    def success_count(self):
+        return self.engine.success_count
+
+    @property
+    def failure_count(self):
+        return self.engine.failure_count
+
+    @property
+    def duplicate_count(self):
+        return self.engine.duplicate_count
 
-        while True:
-            current_time = time.time()
-            elapsed_time = current_time - self.last_frame_time
-            if elapsed_time < 1 / self.target_fps:
-                time.sleep(1 / self.target_fps - elapsed_time)
-                current_time = time.time()
+    @property
+    def barcode_data(self):
+        return self.engine.scanned_barcodes
 
-            ret, frame = cap.read()
-            if not ret:
-                break
+    @property
+    def last_scan_time(self):
+        return self.engine.last_scan_time
+
+    @property
+    def camera_stats(self):
+        """カメラごとの処理フレーム数・成功・重複・失敗数"""
+        return self.engine.source_stats
+
+    def _open_sources(self):
+        """
+        カメラごとにフレームソースを開いてエンジンに追加する。
+        再生時は指定された動画/画像フォルダ1本だけを処理する。
+        """
+        replaying = self.frame_source or self.config.get("replay_source")
+        camera_indices = [None] if replaying else self.camera_indices
+        for i, camera_index in enumerate(camera_indices):
+            cap = open_frame_source(self.config, self.frame_source, camera_index=camera_index)
+            if not cap.isOpened():
+                print(f"⚠ カメラ {camera_index} を開けませんでした。")
+                continue
+            if is_live_source(cap):
+                # 解像度・FOURCC などは open_frame_source でカメラに適用済み
+                self.logger.info("カメラ %s のキャプチャ設定: %s", camera_index, cap.settings)
+
+            # 1台目はインスタンスのアナライザー/オーバーレイを使い、2台目以降はカメラごとに作成する
+            # (ROI追跡や動き検知の状態はカメラごとに独立している必要があるため)
+            if not self.engine.sources:
+                analyzer, overlay = self.analyzer, self.overlay_display
+            else:
+                analyzer, overlay = G_ScanBCD_Analyzer(self.config), OverlayDisplay(self.config)
+                overlay.scanned_info = self.overlay_display.scanned_info  # スキャン済みリストは全カメラで共有
+
+            source = self.engine.add_source(
+                cap, name="replay" if camera_index is None else camera_index, analyzer=analyzer
+            )
+            source["overlay"] = overlay
+            overlay.latency = self.engine.latency
+            source["display_buffer"] = None  # グレースケール取得時の表示用BGRバッファ (使い回す)
+            source["window_name"] = "Barcode Scanner" if i == 0 else f"Barcode Scanner (Camera {camera_index})"
+            source["window_slot"] = i
+
+    def _on_valid_scan(self, event):
+        """新しいバーコードを受け付けたときにエンジンから呼ばれる (CSVへの書き込みはエンジンが行う)"""
+        self.logger.info("スキャン結果: %s (カメラ: %s)", event.data, event.source)
+        print(f"Scanned Barcode: {event.data} Type: {event.type} Camera: {event.source}")
+
+        # scanned_infoへの追加
+        self.add_scanned_info(event.data, event.type)
+
+    def _on_idle_timeout(self):
+        print(
+            f"{self.idle_timeout / 60}分間バーコードが読み込まれなかったため、スキャンを停止します。"
+        )
 
-            barcodes, frame = self.analyzer.analyze(frame)
+    def _on_frame(self, source, frame, barcodes):
+        """1フレームの処理ごとにエンジンから呼ばれ、画面表示と操作の受付を行う"""
+        if not self.headless:
+            # 描画と表示は preview_fps の周期ごとに行い、それ以外のフレームは検出結果の記録だけにする
+            if self.engine.display_clock.due(source["name"]):
+                self._show_frame(source, frame, barcodes)
+            else:
+                source["overlay"].update(barcodes)
 
-            # 残り時間を計算
-            remaining_time = max(
-                0, self.idle_timeout - (time.time() - self.last_scan_time)
+        if self.headless:
+            command = self._command_listener.poll()
+        else:
+            with self.engine.latency.measure("waitkey"):
+                key = cv2.waitKey(1) & 0xFF
+            command = self.KEY_COMMANDS.get(key)
+
+        if command == "stop":  # qキーまたはESCキー
+            print("スキャナー停止")
+            self.engine.stop()
+        elif command == "no_barcode":  # 'N'キーでバーコードなし部品を登録
+            self._register_no_barcode_item()
+        elif command == "manual":  # 'M'キーで図番による手動登録
+            self._register_manual_drawing_item()
+        elif command == "status":
+            print(
+                f"Scans: {self.scan_count}, Success: {self.success_count}, "
+                f"Failure: {self.failure_count}, Duplicates: {self.duplicate_count}, "
+                f"Time left: {int(self.engine.remaining_time())}s"
             )
 
-            # オーバーレイに渡すコンテキストラベルを作成
-            text_mapping = self.config.get("display_text_mapping", {})
-            display_location = text_mapping.get(self.location, self.location)
-            context_label = f"場所: {display_location} | 業者: {self.supplier}"
+    def _show_frame(self, source, frame, barcodes):
+        """オーバーレイを描画してカメラごとのウィンドウに表示する"""
+        camera = source["name"]
+        camera_stats = source["stats"]
+
+        # オーバーレイに渡すコンテキストラベルを作成
+        text_mapping = self.config.get("display_text_mapping", {})
+        display_location = text_mapping.get(self.location, self.location)
+        context_label = f"場所: {display_location} | 業者: {self.supplier}"
+        if len(self.engine.sources) > 1:
+            context_label += (
+                f" | カメラ{camera}: 成功 {camera_stats['success']} / "
+                f"重複 {camera_stats['duplicate']} / 失敗 {camera_stats['failure']}"
+            )
 
-            # オーバーレイを描画
-            frame = self.overlay_display.display_overlay(
+        with self.engine.latency.measure("overlay"):
+            if frame.ndim == 2:
+                # グレースケールで取得している場合は、表示用にのみBGRへ変換する (変換先は使い回す)
+                buffer = source["display_buffer"]
+                if buffer is None or buffer.shape[:2] != frame.shape:
+                    buffer = source["display_buffer"] = np.empty(frame.shape + (3,), dtype=np.uint8)
+                    self.engine.latency.record_allocation("overlay", buffer.nbytes)
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR, dst=buffer)
+            frame = source["overlay"].display_overlay(
                 frame,
                 barcodes,
                 self.scan_count,
-                self.success_count, # 引数を追加
-                self.failure_count, # 引数を追加
+                self.success_count,
+                self.failure_count,
                 self.duplicate_count,
                 context_label, # 整形したラベルを渡す
                 self.construction_number,
-                remaining_time,
+                self.engine.remaining_time(),
                 self.barcode_type,
                 self.expected_length,
+                hint=source["analyzer"].quality_hint,
             )
 
-            if barcodes:
-                self.last_scan_time = time.time()
-
-            for barcode in barcodes:
-                # バーコードを検出した瞬間のタイムスタンプを取得
-                scanned_timestamp = self.get_current_timestamp()
-
-                barcode_info = barcode.data.decode("utf-8")
-                barcode_type = barcode.type
-                if (
-                    barcode_type == self.barcode_type
-                    and len(barcode_info) == self.expected_length
-                ):
-                    if barcode_info not in self.barcode_data:
-                        self.barcode_data.append(barcode_info)
-                        self.scan_count += 1
-                        self.success_count += 1
-                        data = self.data_collector.collect(
-                            barcode_info,
-                            barcode_type,
-                            scanned_timestamp,  # 取得したタイムスタンプを使用
-                            self.location,
-                            self.construction_number,
-                            self.worker_name,
-                        )
-                        self.logger.info("スキャン結果: %s", data)
-                        print(f"Scanned Barcode: {barcode_info} Type: {barcode_type}")
-
-                        # scanned_infoへの追加
-                        self.add_scanned_info(barcode_info, barcode_type)
-                    else:
-                        self.duplicate_count += 1  # 重複したスキャン数を更新
-                else:
-                    self.failure_count += 1 # 不正なバーコードのため失敗カウントを増やす
-
-            if frame is not None and isinstance(frame, np.ndarray):
-                cv2.imshow("Barcode Scanner", frame)
-            else:
-                print("Error: Invalid frame received.")
-
-            # ウィンドウの位置を右側に寄せる
-            screen_width = 1366  # 画面の幅を設定（例として 1920 を使用）
-            window_width = 640  # ウィンドウの幅を設定
-            x = screen_width - window_width - 10  # 右端から 10 ピクセル内側に配置
-            y = 10  # 上端から 10 ピクセル下に配置
-
-            cv2.namedWindow("Barcode Scanner", cv2.WINDOW_NORMAL)
-            cv2.moveWindow("Barcode Scanner", x, y)
-
-            # 5分間バーコードが読み込まれなければ停止
-            if self.auto_stop and remaining_time == 0:
-                print(
-                    f"{self.idle_timeout / 60}分間バーコードが読み込まれなかったため、スキャンを停止します。"
-                )
-                break
+        window_name = source["window_name"]
+        if frame is not None and isinstance(frame, np.ndarray):
+            with self.engine.latency.measure("imshow"):
+                cv2.imshow(window_name, frame)
+        else:
+            print("Error: Invalid frame received.")
 
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord("q") or key == 27:  # qキーまたはESCキー
-                print("スキャナー停止")
-                break
-            elif key == ord("n"):  # 'N'キーでバーコードなし部品を登録
-                self._register_no_barcode_item()
-            elif key == ord("m"):  # 'M'キーで図番による手動登録
-                self._register_manual_drawing_item()
+        # ウィンドウの位置を右側に寄せる (2台目以降は左隣に並べる)
+        screen_width = 1366  # 画面の幅を設定（例として 1920 を使用）
+        window_width = 640  # ウィンドウの幅を設定
+        x = screen_width - (window_width + 10) * (source["window_slot"] + 1)  # 右端から 10 ピクセル内側に配置
+        y = 10  # 上端から 10 ピクセル下に配置
 
-            self.last_frame_time = current_time
+        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+        cv2.moveWindow(window_name, max(0, x), y)
 
-        cap.release()
-        cv2.destroyAllWindows()
+    def start(self):
+        self._open_sources()
+        if not self.engine.sources:
+            print("⚠ 使用できるカメラがありません。スキャンを中止します。")
+            return
+
+        # ヘッドレス時はキー入力の代わりに標準入力/ソケットから操作コマンドを受け付ける
+        self._command_listener = CommandListener(self.config).start() if self.headless else None
+
+        self.engine.run(on_frame=self._on_frame)
+
+        self.engine.close()
+        self.analyzer.close()
+        for source in self.engine.sources:
+            self.logger.info("オーバーレイ統計 (%s): %s", source["name"], source["overlay"].get_stats())
+        self.engine.log_stats(self.logger, extra={
+            "tool": "BarcodeScanner",
+            "location": self.location,
+            "construction_number": self.construction_number,
+            "cameras": [str(name) for name in self.camera_stats],
+        })
+        if self._command_listener is not None:
+            self._command_listener.stop()
+        else:
+            cv2.destroyAllWindows()
 
         # もし作成されていれば、非表示のTkinterルートをクリーンアップ
         if (
@@ -386,12 +477,23 @@ class BarcodeScanner:
 
     def get_current_timestamp(self):
         # ... (タイムスタンプ取得) ...
-        return datetime.now().strftime("%Y%m%d-%H%M%S")
+        return get_current_timestamp()
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="バーコードスキャナー (単体起動)")
+    parser.add_argument("--replay", help="カメラの代わりに再生する動画ファイルまたは画像フォルダ")
+    parser.add_argument("--realtime", action="store_true", help="記録時の速度で再生する (省略時は最速で処理)")
+    parser.add_argument("--headless", action="store_true", help="画面表示なしで動作する")
+    parser.add_argument("--cameras", type=int, nargs="+", help="使用するカメラ番号 (複数指定可)")
+    args = parser.parse_args()
+
     print("\n単体起動中...")
     config = Config("config.json")
+    if args.realtime:
+        config.set("replay_realtime", True)
     standalone_display_time = 300
     config.set("display_time", standalone_display_time)
     print(f"\t display_time を {standalone_display_time} 秒に設定しました。")
@@ -400,6 +502,7 @@ if __name__ == "__main__":
     construction_number = "_4656_"
     print(f"\t construction_number を {construction_number} に設定しました。")
     scanner = BarcodeScanner(
-        config=config, location=location, construction_number=construction_number
+        config=config, location=location, construction_number=construction_number,
+        frame_source=args.replay, headless=args.headless or None, camera_indices=args.cameras,
     )
     scanner.start()
@@ -1,6 +1,7 @@
 # G_ScanBCD_main.py
 
 import sys
+import argparse
 import subprocess
 import os
 import json
@@ -45,11 +46,12 @@ def select_location_and_construction(config):
     return location, construction_number, supplier
 
 
-def start_barcode_scanning(config, location, construction_number, supplier):
+def start_barcode_scanning(config, location, construction_number, supplier, frame_source=None, headless=None):
     """Initializes and starts the barcode scanner."""
     print("バーコードスキャナーを起動しています...")
     scanner = BarcodeScanner(
-        config=config, location=location, construction_number=construction_number, supplier=supplier
+        config=config, location=location, construction_number=construction_number, supplier=supplier,
+        frame_source=frame_source, headless=headless,
     )
     scanner.start()
     return scanner
@@ -181,19 +183,68 @@ def show_tool_launcher_dialog():
                 print(f"部品情報表示ツールの起動中にエラーが発生しました: {e}")
 
 
+def print_results(scanner, location, construction_number, supplier, verification_result, csv_status):
+    """ヘッドレス時に、結果ダイアログの代わりにスキャン結果を標準出力に表示する"""
+    print("--- スキャン結果 ---")
+    print(f"工事番号: {construction_number}")
+    print(f"場所: {location}")
+    print(f"納品業者: {supplier if supplier else '未指定'}")
+    print(f"スキャン数: {scanner.scan_count} 件 (成功: {scanner.success_count} 件)")
+    if csv_status["duplicates"] > 0:
+        print(f"  重複削除: {csv_status['duplicates']} 件")
+    if csv_status["invalid"] > 0:
+        print(f"  データ異常: {csv_status['invalid']} 件")
+    if len(scanner.camera_stats) > 1:
+        for camera, stats in scanner.camera_stats.items():
+            print(f"  カメラ {camera}: 成功 {stats['success']} / 重複 {stats['duplicate']} / 失敗 {stats['failure']} 件")
+    latency_text = scanner.engine.latency.format()
+    if latency_text:
+        print("処理時間:")
+        print(latency_text)
+    if verification_result.get("source_loaded"):
+        print(f"図面照合OK: {verification_result['match_count']} / {verification_result['total_source_count']} 件")
+        if verification_result["mismatch_count"] > 0:
+            print(f"照合不明(NG): {verification_result['mismatch_count']} 件")
+    else:
+        print("図面データ: なし (照合不可)")
+
+
+def parse_arguments():
+    """コマンドライン引数を解析する"""
+    parser = argparse.ArgumentParser(description="バーコードスキャンアプリケーション")
+    parser.add_argument("--headless", action="store_true",
+                        help="画面表示なしで動作する (--location と --construction-number が必須)")
+    parser.add_argument("--location", help="保管場所 (ヘッドレス時)")
+    parser.add_argument("--construction-number", help="工事番号 (ヘッドレス時)")
+    parser.add_argument("--supplier", default="", help="納品業者 (ヘッドレス時)")
+    parser.add_argument("--replay", help="カメラの代わりに再生する動画ファイルまたは画像フォルダ")
+    return parser.parse_args()
+
+
 def main():
     """Main function to run the barcode scanning application."""
     print("実行しています...")
-    
+    args = parse_arguments()
+
     config = load_configuration()
     if config is None:
         return
 
-    location, construction_number, supplier = select_location_and_construction(config)
-    if location is None:
-        return
-
-    scanner = start_barcode_scanning(config, location, construction_number, supplier)
+    headless = args.headless or config.get("headless", False)
+    if headless:
+        # ヘッドレス時は場所選択ダイアログを表示せず、引数から受け取る
+        if not args.location or not args.construction_number:
+            print("Error: ヘッドレス時は --location と --construction-number を指定してください。")
+            return
+        location, construction_number, supplier = args.location, args.construction_number, args.supplier
+    else:
+        location, construction_number, supplier = select_location_and_construction(config)
+        if location is None:
+            return
+
+    scanner = start_barcode_scanning(
+        config, location, construction_number, supplier, frame_source=args.replay, headless=headless
+    )
     if scanner is None:
         return
 
@@ -205,6 +256,11 @@ def main():
     csv_handler = CSVHandler(csv_file, config)
     csv_status = csv_handler.check_data_status()
 
+    if headless:
+        print_results(scanner, location, construction_number, supplier, verification_result, csv_status)
+        print("バーコードスキャンアプリケーションのメイン処理を終了します。")
+        return
+
     # ResultDisplay クラスのインスタンスを作成
     result_display = ResultDisplay()
     # show_results メソッドを呼び出し、スキャン結果と照合結果を表示
@@ -217,7 +273,9 @@ def main():
         verification_result=verification_result,
         success_count=scanner.success_count,
         duplicate_count=csv_status["duplicates"],
-        failure_count=csv_status["invalid"]
+        failure_count=csv_status["invalid"],
+        camera_stats=scanner.camera_stats,
+        latency_summary=scanner.engine.latency.summary(),
     )
 
     run_csv_duplicate_check(config, construction_number)
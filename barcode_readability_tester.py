@@ -1,12 +1,18 @@
 import cv2
 import numpy as np
-from pyzbar.pyzbar import decode
 import time
 import csv
 import sys
 import os
 from datetime import datetime
 from G_config import Config # 設定ファイル管理クラスをインポート
+from G_ScanBCD_Decoders import ALL_BARCODE_TYPES
+from G_ScanBCD_Engine import ScanEngine # スキャナ本体と同じ取得処理・デコーダーを使用
+from G_ScanBCD_FrameSource import open_frame_source
+from G_ScanBCD_QualityGate import ( # 品質判定 (quality_gate_enabled) と同じ測定方法・閾値を使用
+    DEFAULT_FOCUS_THRESHOLD, BRIGHTNESS_TOO_DARK_THRESHOLD, BRIGHTNESS_TOO_BRIGHT_THRESHOLD, DEFAULT_MEASURE_WIDTH,
+    downscale_for_measure, measure_focus, measure_brightness,
+)
 
 """
 バーコード読み取りテスト用スクリプト
@@ -37,20 +43,20 @@ config = Config("config.json")
 tester_settings = config.get("readability_tester_settings", {})
 
 # ぼやけ検出の閾値
-FOCUS_THRESHOLD = tester_settings.get("focus_threshold", 115.0)
-
-# 明るさ検出の閾値 (固定値でOKな場合が多い)
-BRIGHTNESS_TOO_DARK_THRESHOLD = 70
-BRIGHTNESS_TOO_BRIGHT_THRESHOLD = 180
+FOCUS_THRESHOLD = tester_settings.get("focus_threshold", DEFAULT_FOCUS_THRESHOLD)
+# ぼやけ・明るさを測定する縮小画像の幅 (品質判定と同じ幅で測定し、調整した閾値をそのまま使えるようにする)
+MEASURE_WIDTH = config.get("quality_measure_width", DEFAULT_MEASURE_WIDTH)
 
 # バーコードの推奨サイズ（面積）の閾値
 SIZE_TOO_SMALL_THRESHOLD = tester_settings.get("size_too_small_threshold", 6500)
 SIZE_TOO_LARGE_THRESHOLD = tester_settings.get("size_too_large_threshold", 148000)
 
 # カメラ設定 (config.jsonのグローバル設定から読み込み)
-CAMERA_INDEX = 0
-CAMERA_WIDTH = 640
-CAMERA_HEIGHT = 480
+CAMERA_INDEX = config.get("camera_index", 0)
+if isinstance(CAMERA_INDEX, (list, tuple)):
+    CAMERA_INDEX = CAMERA_INDEX[0]  # 複数台指定時は1台目を使用
+CAMERA_WIDTH = config.get("camera_width", 640)
+CAMERA_HEIGHT = config.get("camera_height", 480)
 
 
 def draw_gauge(frame, y_pos, label, value, min_val, max_val, optimal_min, optimal_max, peak_value):
@@ -108,9 +114,10 @@ def analyze_readability(frame, barcodes):
 
     # 1. グレースケールに変換
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = downscale_for_measure(gray, MEASURE_WIDTH)
     
     # 2. ぼやけ具合を分析 (ラプラシアン分散)
-    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+    laplacian_var = measure_focus(small)
     focus_status = 'ok'
     if laplacian_var < FOCUS_THRESHOLD:
         focus_status = 'low'
@@ -119,7 +126,7 @@ def analyze_readability(frame, barcodes):
     analysis_results['Focus'] = {'value': laplacian_var, 'status': focus_status}
 
     # 3. 明るさを分析 (平均輝度)
-    mean_brightness = np.mean(gray)
+    mean_brightness = measure_brightness(small)
     brightness_status = 'ok'
     if mean_brightness < BRIGHTNESS_TOO_DARK_THRESHOLD:
         brightness_status = 'low'
@@ -153,6 +160,23 @@ def analyze_readability(frame, barcodes):
     analysis_results['Size'] = {'value': barcode_area, 'status': size_status}
 
     return primary_issue_text, primary_issue_color, analysis_results
+def tester_config(config_instance):
+    """
+    読み取りテスト用のエンジンの設定。読めない原因を調べるため、barcode_type に関わらず全種類のバーコードを
+    毎フレーム画像全体をデコードする (動き検知・品質判定による省略、追跡領域のみのデコード、
+    ワーカープロセスでの並列デコードは使用しない)。
+    """
+    config = dict(config_instance.config)
+    config.update({
+        "barcode_type": list(ALL_BARCODE_TYPES),
+        "decode_workers": 0,
+        "roi_tracking_enabled": False,
+        "motion_gate_enabled": False,
+        "quality_gate_enabled": False,
+    })
+    return config
+
+
 def run_test(config_instance):
     # --- ロギング設定 ---
     log_dir = "log"
@@ -171,13 +195,13 @@ def run_test(config_instance):
         log_writer.writerow(log_header)
 
 
-    cap = cv2.VideoCapture(CAMERA_INDEX)
+    # カメラの設定 (解像度・FOURCC など) とデコーダーはスキャナ本体と共通
+    cap = open_frame_source(config_instance, camera_index=CAMERA_INDEX)
     if not cap.isOpened():
         print(f"Error: Could not open camera (index: {CAMERA_INDEX}).")
         return
-
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+    engine = ScanEngine(tester_config(config_instance))
+    source = engine.add_source(cap, name=CAMERA_INDEX)
 
     print("Starting barcode readability test. Press 'q' to quit.")
 
@@ -214,10 +238,16 @@ def run_test(config_instance):
     scanned_unique_barcodes = set()
 
     while True:
-        ret, frame = cap.read()
+        engine.pace()
+        ret, frame = source["grabber"].read()
         if not ret:
-            print("Error: Could not get frame from camera.")
-            break
+            if source["grabber"].ended:
+                print("Error: Could not get frame from camera.")
+                break
+            continue
+        if frame.ndim == 2:
+            # グレースケールで取得している場合は、描画用にBGRへ変換する
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
 
         # --- 2値化ウィンドウの表示 ---
         current_time_for_update = time.time()
@@ -248,7 +278,8 @@ def run_test(config_instance):
 
         # --- 常にバーコード検出を試み、検出された領域を描画 ---
         # 読み取り成否に関わらず、バーコードとして検出された領域を取得
-        all_detected_barcodes = decode(frame)
+        # 読み取り結果の登録は行わず、解析だけをエンジンの解析器で行う
+        all_detected_barcodes, _ = engine.analyzer.analyze(frame)
         
         # 検出されたがデコードに失敗した領域を黄色で描画
         for barcode in all_detected_barcodes:
@@ -259,11 +290,11 @@ def run_test(config_instance):
         # pyzbarでバーコードをデコード
         current_time = time.time()
         
-        # クールダウン期間中はデコード処理をスキップ
+        # クールダウン期間中はデコード結果を使用しない (同じフレームを再デコードせず上の結果を使う)
         if current_time - last_success_time < COOLDOWN_PERIOD:
             decoded_objects = []
         else:
-            decoded_objects = decode(frame)
+            decoded_objects = all_detected_barcodes
 
         status_text = ""
         status_color = (0, 255, 0) # デフォルトは緑 (成功)
@@ -423,7 +454,7 @@ def run_test(config_instance):
         if key == ord('q') or key == 27: # 'q' または ESC
             break
 
-    cap.release()
+    engine.close()
     cv2.destroyAllWindows()
     log_file.close() # ファイルを閉じる
     print("Test finished.")
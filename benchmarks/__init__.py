@@ -0,0 +1,3 @@
+# benchmarks
+# デコード処理や描画処理の性能を、カメラなしで再現性をもって計測するためのベンチマーク集
+# 実行例: python -m benchmarks.bench_decode
@@ -0,0 +1,139 @@
+# benchmarks/bench_decode.py
+# 合成した CODE39 ラベル画像を G_ScanBCD_Analyzer でデコードし、前処理の設定ごとに処理速度と正解率を計測する
+#
+# 実行例 (リポジトリのルートで):
+#   python -m benchmarks.bench_decode
+#   python -m benchmarks.bench_decode --samples 50 --output log/bench_decode.json
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from G_config import Config  # noqa: E402
+from G_ScanBCD_Analyzer import G_ScanBCD_Analyzer  # noqa: E402
+from benchmarks.code39 import DISTORTION_CASES, distort, random_digits, render_code39  # noqa: E402
+
+# 計測する前処理の設定 (名前 -> preprocess_stages)
+PREPROCESS_SETTINGS = {
+    "gray": ["gray"],
+    "clahe": ["gray", "clahe"],
+    "threshold": ["gray", "adaptive_threshold"],
+    "morphology": ["gray", "adaptive_threshold", "morphology"],
+    "upscale": ["gray", "upscale"],
+    "rotate": ["gray", "rotate"],
+    "full": ["gray", "clahe", "adaptive_threshold", "morphology", "upscale", "rotate"],
+}
+
+
+def make_samples(case, count, length, seed):
+    """劣化条件 case の画像を count 枚生成する。戻り値: [(期待値, 画像), ...]"""
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(count):
+        expected = random_digits(rng, length)
+        label = render_code39(expected, narrow=int(rng.integers(2, 4)))
+        samples.append((expected, distort(label, rng, **DISTORTION_CASES[case])))
+    return samples
+
+
+def benchmark_config(base_config, stages, budget_ms):
+    """ベンチマーク用に、1枚ずつ独立してデコードする設定を作成する"""
+    config = dict(base_config)
+    config.update({
+        "preprocess_stages": stages,
+        "preprocess_time_budget_ms": budget_ms,
+        # フレーム間の状態に依存しないよう、追跡・動き検知・位置検出・並列デコードは使用しない
+        "roi_tracking_enabled": False,
+        "motion_gate_enabled": False,
+        "decode_workers": 0,
+        # 位置検出で読めなかった画像も必ず画像全体をデコードするよう、位置検出は使用しない
+        "localize_enabled": False,
+        # 品質判定はカメラ映像向けのため、画像を丸ごと省略しないよう使用しない
+        "quality_gate_enabled": False,
+    })
+    return config
+
+
+def run_case(analyzer, samples):
+    """サンプルを順にデコードし、正解数と1枚あたりの処理時間を返す"""
+    correct = 0
+    latencies = []
+    for expected, image in samples:
+        start = time.perf_counter()
+        barcodes, _ = analyzer.analyze(image)
+        barcodes += analyzer.flush()  # 先行投入された場合も、この画像の結果を待ってから次に進む
+        latencies.append(time.perf_counter() - start)
+        if any(barcode.data.decode("utf-8", "replace") == expected for barcode in barcodes):
+            correct += 1
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "samples": len(samples),
+        "accuracy": round(correct / len(samples), 4) if samples else 0.0,
+        "mean_ms": round(float(latencies_ms.mean()), 2),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "images_per_s": round(len(samples) / (latencies_ms.sum() / 1000), 1) if latencies_ms.sum() > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成 CODE39 ラベルによるデコード性能ベンチマーク")
+    parser.add_argument("--config", default="config.json", help="基にする設定ファイル")
+    parser.add_argument("--samples", type=int, default=30, help="劣化条件ごとの画像枚数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード (同じ値なら同じ画像が生成される)")
+    parser.add_argument("--length", type=int, help="バーコードの桁数 (省略時は expected_length)")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="前処理の時間予算 (ms)。既定では予算で打ち切らない")
+    parser.add_argument("--settings", nargs="+", choices=sorted(PREPROCESS_SETTINGS), help="計測する前処理の設定")
+    parser.add_argument("--cases", nargs="+", choices=sorted(DISTORTION_CASES), help="計測する劣化条件")
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    args = parser.parse_args()
+
+    base_config = Config(args.config).config
+    length = args.length or base_config.get("expected_length", 10)
+    settings = args.settings or list(PREPROCESS_SETTINGS)
+    cases = args.cases or list(DISTORTION_CASES)
+
+    # 劣化条件ごとの画像は全ての設定で共通にする
+    samples = {case: make_samples(case, args.samples, length, args.seed + i) for i, case in enumerate(cases)}
+
+    results = {}
+    for setting in settings:
+        analyzer = G_ScanBCD_Analyzer(benchmark_config(base_config, PREPROCESS_SETTINGS[setting], args.budget_ms))
+        results[setting] = {}
+        try:
+            for case in cases:
+                result = run_case(analyzer, samples[case])
+                results[setting][case] = result
+                print(
+                    f"{setting:>10} / {case:<12} 正解率 {result['accuracy'] * 100:5.1f}%  "
+                    f"平均 {result['mean_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+                    f"{result['images_per_s']:7.1f} 枚/秒"
+                )
+        finally:
+            analyzer.close()
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        report = {
+            "timestamp": datetime.now().strftime("%Y%m%d-%H%M%S"),
+            "samples_per_case": args.samples,
+            "seed": args.seed,
+            "length": length,
+            "decoder_backend": base_config.get("decoder_backend", "pyzbar"),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+        print(f"結果を {args.output} に書き出しました。")
+
+
+if __name__ == "__main__":
+    main()
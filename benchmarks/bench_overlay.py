@@ -0,0 +1,146 @@
+# benchmarks/bench_overlay.py
+# OverlayDisplay の描画方式 (overlay_renderer) ごとに、1フレームあたりの描画時間と描画結果の差を計測する
+#
+# 実行例 (リポジトリのルートで):
+#   python -m benchmarks.bench_overlay
+#   python -m benchmarks.bench_overlay --frames 300 --barcodes 3 --output log/bench_overlay.json
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from G_config import Config  # noqa: E402
+from G_ScanBCD_Decoders import DecodedBarcode, Point, Rect  # noqa: E402
+from G_ScanBCD_Overlay import OverlayDisplay  # noqa: E402
+from G_ScanBCD_OverlayCanvas import OVERLAY_RENDERERS  # noqa: E402
+from benchmarks.code39 import make_background, random_digits  # noqa: E402
+
+REFERENCE_RENDERER = "pil"  # 描画結果を比較する基準の描画方式
+
+
+def make_barcodes(rng, count, length, width, height):
+    """画面内に並べたダミーのデコード結果を count 件作成する"""
+    barcodes = []
+    for i in range(count):
+        x = int(rng.integers(20, max(21, width - 260)))
+        y = int(height * (i + 1) / (count + 2))
+        w, h = int(rng.integers(160, 240)), int(rng.integers(40, 70))
+        polygon = [Point(x, y), Point(x + w, y), Point(x + w, y + h), Point(x, y + h)]
+        barcodes.append(DecodedBarcode(random_digits(rng, length).encode(), "CODE39", Rect(x, y, w, h), polygon, 1, None))
+    return barcodes
+
+
+def make_overlay(base_config, renderer, scanned):
+    """描画方式を指定した OverlayDisplay を作成し、スキャン済みリストを設定する"""
+    config = dict(base_config)
+    config["overlay_renderer"] = renderer
+    overlay = OverlayDisplay(config)
+    now = time.time()
+    # 計測中に表示期限切れにならないよう、未来の時刻で登録する
+    overlay.scanned_info.extend({"barcode": data, "type": "CODE39", "timestamp": now + 3600} for data in scanned)
+    return overlay
+
+
+def render(overlay, frame, barcodes, hint):
+    return overlay.display_overlay(
+        frame.copy(), barcodes, 120, 100, 5, 15,
+        "場所: K1 | 業者: ベンチマーク", "4656", 240, "CODE39", len(barcodes[0].data) if barcodes else 10,
+        hint=hint,
+    )
+
+
+def run_renderer(overlay, frame, barcodes, frames, hint):
+    """同じ入力で frames 回描画し、1フレームあたりの描画時間を返す"""
+    render(overlay, frame, barcodes, hint)  # 文字のマスクなどのキャッシュを作成しておく
+    latencies = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        render(overlay, frame, barcodes, hint)
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "frames": frames,
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "fps": round(frames / (latencies_ms.sum() / 1000), 1) if latencies_ms.sum() > 0 else 0.0,
+    }
+
+
+def compare(reference, image):
+    """基準の描画結果との差 (平均絶対誤差と、差が大きい画素の割合) を返す"""
+    diff = np.abs(reference.astype(np.int16) - image.astype(np.int16)).max(axis=2)
+    return {
+        "mean_abs_diff": round(float(diff.mean()), 3),
+        "max_abs_diff": int(diff.max()),
+        "pixels_over_64": round(float((diff > 64).mean()), 5),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="オーバーレイ描画方式のベンチマーク")
+    parser.add_argument("--config", default="config.json", help="基にする設定ファイル")
+    parser.add_argument("--frames", type=int, default=200, help="描画方式ごとの描画回数")
+    parser.add_argument("--barcodes", type=int, default=2, help="画面に表示するバーコードの数")
+    parser.add_argument("--scanned", type=int, default=3, help="スキャン済みリストの行数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--no-hint", action="store_true", help="品質判定のヒントを表示しない")
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    args = parser.parse_args()
+
+    base_config = Config(args.config).config
+    width = base_config.get("camera_width", 640)
+    height = base_config.get("camera_height", 480)
+    length = base_config.get("expected_length", 10)
+
+    rng = np.random.default_rng(args.seed)
+    frame = make_background(rng, width, height)
+    barcodes = make_barcodes(rng, args.barcodes, length, width, height)
+    scanned = [random_digits(rng, length) for _ in range(args.scanned)]
+    hint = None if args.no_hint else "動かさずに保持してください"
+
+    results = {}
+    outputs = {}
+    for renderer in OVERLAY_RENDERERS:
+        overlay = make_overlay(base_config, renderer, scanned)
+        outputs[renderer] = render(overlay, frame, barcodes, hint)
+        results[renderer] = run_renderer(overlay, frame, barcodes, args.frames, hint)
+
+    for renderer in OVERLAY_RENDERERS:
+        result = results[renderer]
+        if renderer != REFERENCE_RENDERER:
+            result.update(compare(outputs[REFERENCE_RENDERER], outputs[renderer]))
+        speedup = results[REFERENCE_RENDERER]["mean_ms"] / result["mean_ms"] if result["mean_ms"] else 0.0
+        result["speedup"] = round(speedup, 2)
+        line = (
+            f"{renderer:>6}  平均 {result['mean_ms']:7.3f} ms  p95 {result['p95_ms']:7.3f} ms  "
+            f"{result['fps']:8.1f} FPS  ({result['speedup']:.2f} 倍)"
+        )
+        if renderer != REFERENCE_RENDERER:
+            line += f"  差: 平均 {result['mean_abs_diff']} / 64超 {result['pixels_over_64'] * 100:.2f}% の画素"
+        print(line)
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        report = {
+            "timestamp": datetime.now().strftime("%Y%m%d-%H%M%S"),
+            "frame_size": [width, height],
+            "barcodes": args.barcodes,
+            "scanned": args.scanned,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+        print(f"結果を {args.output} に書き出しました。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/code39.py
+# ベンチマーク用に CODE39 のラベル画像を生成し、ぼけ・ノイズ・回転などの劣化を加えるモジュール
+
+import cv2
+import numpy as np
+
+# CODE39 の符号化表 (バー・スペースを交互に9本。n = 細, w = 太。各文字とも太は3本)
+CODE39_PATTERNS = {
+    "0": "nnnwwnwnn", "1": "wnnwnnnnw", "2": "nnwwnnnnw", "3": "wnwwnnnnn",
+    "4": "nnnwwnnnw", "5": "wnnwwnnnn", "6": "nnwwwnnnn", "7": "nnnwnnwnw",
+    "8": "wnnwnnwnn", "9": "nnwwnnwnn", "A": "wnnnnwnnw", "B": "nnwnnwnnw",
+    "C": "wnwnnwnnn", "D": "nnnnwwnnw", "E": "wnnnwwnnn", "F": "nnwnwwnnn",
+    "G": "nnnnnwwnw", "H": "wnnnnwwnn", "I": "nnwnnwwnn", "J": "nnnnwwwnn",
+    "K": "wnnnnnnww", "L": "nnwnnnnww", "M": "wnwnnnnwn", "N": "nnnnwnnww",
+    "O": "wnnnwnnwn", "P": "nnwnwnnwn", "Q": "nnnnnnwww", "R": "wnnnnnwwn",
+    "S": "nnwnnnwwn", "T": "nnnnwnwwn", "U": "wwnnnnnnw", "V": "nwwnnnnnw",
+    "W": "wwwnnnnnn", "X": "nwnnwnnnw", "Y": "wwnnwnnnn", "Z": "nwwnwnnnn",
+    "-": "nwnnnnwnw", ".": "wwnnnnwnn", " ": "nwwnnnwnn", "$": "nwnwnwnnn",
+    "/": "nwnwnnnwn", "+": "nwnnnwnwn", "%": "nnnwnwnwn", "*": "nwnnwnwnn",
+}
+
+
+def encode_code39(text, narrow=2, ratio=2.5):
+    """
+    文字列を CODE39 のバー幅のリストに変換する (スタート/ストップ文字 * を付加)。
+    戻り値: [(幅px, バーならTrue), ...]
+    """
+    wide = int(round(narrow * ratio))
+    elements = []
+    for i, char in enumerate(f"*{text.upper()}*"):
+        pattern = CODE39_PATTERNS.get(char)
+        if pattern is None:
+            raise ValueError(f"CODE39 で表現できない文字です: {char!r}")
+        if i > 0:
+            elements.append((narrow, False))  # 文字間のスペース
+        for j, width in enumerate(pattern):
+            elements.append((wide if width == "w" else narrow, j % 2 == 0))
+    return elements
+
+
+def render_code39(text, narrow=2, ratio=2.5, height=80, quiet_zone=20, with_text=True):
+    """白地に黒バーの CODE39 ラベル画像 (グレースケール) を生成する"""
+    elements = encode_code39(text, narrow, ratio)
+    bars_width = sum(width for width, _ in elements)
+    text_height = 24 if with_text else 0
+    label = np.full((height + text_height + 2 * 10, bars_width + 2 * quiet_zone), 255, dtype=np.uint8)
+
+    x = quiet_zone
+    for width, is_bar in elements:
+        if is_bar:
+            label[10:10 + height, x:x + width] = 0
+        x += width
+
+    if with_text:
+        (text_w, _), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+        cv2.putText(label, text, ((label.shape[1] - text_w) // 2, 10 + height + 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, 0, 1, cv2.LINE_AA)
+    return label
+
+
+def random_digits(rng, length):
+    """length 桁のランダムな数字列を返す"""
+    return "".join(str(d) for d in rng.integers(0, 10, size=length))
+
+
+def make_background(rng, width=640, height=480):
+    """机や段ボールを想定した、ムラのある背景 (BGR) を生成する"""
+    base = rng.integers(90, 170)
+    small = rng.normal(base, 25, size=(height // 16 + 1, width // 16 + 1)).clip(0, 255).astype(np.uint8)
+    background = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    tint = rng.uniform(0.85, 1.15, size=3)
+    return np.dstack([(background * t).clip(0, 255).astype(np.uint8) for t in tint])
+
+
+def distort(label, rng, background=None, scale=1.0, rotation=0.0, perspective=0.0,
+            blur=0.0, noise=0.0, brightness=0.0, contrast=1.0):
+    """
+    ラベルを背景に配置し、劣化を加えたカメラ画像 (BGR) を生成する。
+      scale: ラベルの拡大率, rotation: 回転角 (度), perspective: 四隅のずれ (ラベル寸法に対する割合),
+      blur: ガウスぼかしの sigma, noise: ガウスノイズの標準偏差,
+      brightness: 明るさの加算値, contrast: コントラストの倍率
+    """
+    if background is None:
+        background = make_background(rng)
+    frame_h, frame_w = background.shape[:2]
+    label_h, label_w = label.shape[:2]
+
+    # ラベルの四隅を、拡大・回転・透視のずれを加えて画面中央付近に配置する
+    corners = np.float32([[0, 0], [label_w, 0], [label_w, label_h], [0, label_h]])
+    centered = (corners - [label_w / 2, label_h / 2]) * scale
+    angle = np.deg2rad(rotation)
+    rotation_matrix = np.float32([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    placed = centered @ rotation_matrix.T
+    if perspective:
+        placed += rng.uniform(-perspective, perspective, size=(4, 2)) * [label_w * scale, label_h * scale]
+    offset = rng.uniform(-0.1, 0.1, size=2) * [frame_w, frame_h]
+    placed += [frame_w / 2 + offset[0], frame_h / 2 + offset[1]]
+
+    matrix = cv2.getPerspectiveTransform(corners, placed.astype(np.float32))
+    label_bgr = cv2.cvtColor(label, cv2.COLOR_GRAY2BGR)
+    warped = cv2.warpPerspective(label_bgr, matrix, (frame_w, frame_h), flags=cv2.INTER_LINEAR)
+    mask = cv2.warpPerspective(np.full((label_h, label_w), 255, np.uint8), matrix, (frame_w, frame_h))
+    frame = np.where(mask[:, :, None] > 127, warped, background)
+
+    if blur > 0:
+        frame = cv2.GaussianBlur(frame, (0, 0), blur)
+    frame = frame.astype(np.float32) * contrast + brightness
+    if noise > 0:
+        frame += rng.normal(0, noise, size=frame.shape)
+    return frame.clip(0, 255).astype(np.uint8)
+
+
+# 劣化条件のプリセット (名前 -> distort() の引数)
+DISTORTION_CASES = {
+    "clean": {},
+    "blur": {"blur": 1.5},
+    "noise": {"noise": 18.0},
+    "rotation": {"rotation": 12.0},
+    "perspective": {"perspective": 0.08},
+    "small": {"scale": 0.6},
+    "dark": {"brightness": -70.0, "contrast": 0.6},
+    "bright": {"brightness": 60.0, "contrast": 0.7},
+    "combined": {"blur": 1.0, "noise": 10.0, "rotation": 6.0, "perspective": 0.04, "scale": 0.8, "brightness": -30.0},
+}
@@ -0,0 +1,59 @@
+# tests/test_localize.py
+# 位置検出デコード (localize_enabled) が、模様のある背景の上で傾いたラベルを見つけられることを確認する
+#
+# 実行例 (リポジトリのルートで):
+#   python -m pytest tests
+
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from G_ScanBCD_Analyzer import G_ScanBCD_Analyzer  # noqa: E402
+from G_ScanBCD_Decoders import available_backends  # noqa: E402
+from benchmarks.code39 import distort, make_background, render_code39  # noqa: E402
+
+VALUE = "4656123456"
+
+
+def make_analyzer(backend):
+    return G_ScanBCD_Analyzer({"barcode_type": "CODE39", "decoder_backend": backend, "localize_enabled": True})
+
+
+def rotated_label_frame(rotation, seed=0):
+    """1280x720 の模様のある背景に、rotation 度傾けたラベルを置いたグレースケール画像"""
+    rng = np.random.default_rng(seed)
+    frame = distort(render_code39(VALUE), rng, background=make_background(rng, 1280, 720), rotation=rotation)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+@pytest.mark.parametrize("rotation", [0, -25, 45, 60])
+def test_localize_finds_rotated_label(rotation):
+    analyzer = make_analyzer(available_backends()[0] if available_backends() else "pyzbar")
+    gray = rotated_label_frame(rotation)
+    height, width = gray.shape
+
+    candidates = analyzer._localize(gray)
+
+    assert candidates, "候補領域が見つかりません"
+    (cx, cy), (w, h), _ = candidates[0]
+    # ラベルは画面中央付近 (±10%) に置かれる。背景全体が1つの候補になってはいけない
+    assert abs(cx - width / 2) < width * 0.15 and abs(cy - height / 2) < height * 0.15
+    assert w * h < width * height * analyzer.localize_max_area_ratio
+
+
+@pytest.mark.parametrize("rotation", [-25, 60])
+def test_localized_decode_reads_rotated_label(rotation):
+    backends = [name for name in ("pyzbar", "zxing") if name in available_backends()]
+    if not backends:
+        pytest.skip("傾いた CODE39 を読めるデコーダーのバックエンドがありません")
+    analyzer = make_analyzer(backends[0])
+
+    barcodes = analyzer._decode_localized(rotated_label_frame(rotation))
+
+    assert VALUE.encode("utf-8") in [barcode.data for barcode in barcodes]